@@ -0,0 +1,161 @@
+"""
+Headless batch generation, builds one level per seed over a pool of worker processes
+
+Every worker writes the levels it builds straight to disk as dungeon files (see storage.py) and only sends back the
+file name, so the parent never holds more than a few finished maps worth of bookkeeping no matter how many seeds are
+asked for.
+
+Example, 10000 levels over 8 processes:
+    python batch.py --seeds 0 10000 --workers 8 --out levels
+"""
+import argparse
+import json
+import os
+import time
+
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from loguru import logger
+from typing import Iterator, List
+
+from generator import DungeonGenerator
+
+DEFAULT_SETTINGS = {
+    "map_height": 100,
+    "map_width": 101,
+    "min_room_size": 5,
+    "max_room_size": 11,
+    "room_margin": 1,
+    "num_rooms": 100,
+}
+
+
+def generate_level(map_settings: dict, seed: int) -> DungeonGenerator:
+    """
+    Builds a single level with DungeonGenerator.create_dungeon, the same stages the UI runs
+    :param map_settings: map size, number of rooms, room sizes and margin
+    :type map_settings: dict
+    :param seed: seed for every random choice made while building the level
+    :type seed: int
+    :return: the generator holding the finished dungeon
+    :rtype: DungeonGenerator
+    """
+    generator = DungeonGenerator(dict(map_settings, seed=seed))
+    generator.create_dungeon()
+    return generator
+
+
+def level_path(out_dir: str, seed: int) -> str:
+    return os.path.join(out_dir, f"level_{seed:08d}.dgn")
+
+
+def save_level(generator: DungeonGenerator, path: str):
+    """
+    Writes a level, the file is renamed into place so a crash never leaves half a map
+    """
+    partial = path + ".partial"
+    generator.save(partial)
+    os.replace(partial, path)
+
+
+def generate_batch(map_settings: dict, seeds: List[int], out_dir: str) -> List[str]:
+    """
+    Worker entry point, builds and saves the level of every seed in turn
+    :return: paths of the written files
+    :rtype: List[str]
+    """
+    paths = []
+    for seed in seeds:
+        path = level_path(out_dir, seed)
+        save_level(generate_level(map_settings, seed), path)
+        paths.append(path)
+    return paths
+
+
+def chunk_seeds(first: int, last: int, chunk_size: int) -> Iterator[List[int]]:
+    for start in range(first, last, chunk_size):
+        yield list(range(start, min(start + chunk_size, last)))
+
+
+def run(map_settings: dict, first_seed: int, last_seed: int, out_dir: str, workers: int = None,
+        chunk_size: int = 16, in_flight: int = None) -> int:
+    """
+    Generates the levels for seeds first_seed up to but not including last_seed
+    Seeds are handed out in chunks so small maps are not dominated by the cost of sending a task, and only a
+    bounded number of chunks are queued at once so memory stays flat for any seed range
+    :param map_settings: settings passed to every DungeonGenerator
+    :type map_settings: dict
+    :param first_seed: first seed to generate
+    :type first_seed: int
+    :param last_seed: seed to stop before
+    :type last_seed: int
+    :param out_dir: directory the levels are written to, created if missing
+    :type out_dir: str
+    :param workers: number of worker processes, the number of cores if None
+    :type workers: int
+    :param chunk_size: number of seeds each task builds
+    :type chunk_size: int
+    :param in_flight: number of tasks queued at once, 4 per worker if None
+    :type in_flight: int
+    :return: number of levels written
+    :rtype: int
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    workers = workers or os.cpu_count()
+    in_flight = in_flight or workers * 4
+    chunks = chunk_seeds(first_seed, last_seed, chunk_size)
+    written = 0
+    started = time.perf_counter()
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = set()
+        for seeds in chunks:
+            pending.add(executor.submit(generate_batch, map_settings, seeds, out_dir))
+            if len(pending) < in_flight:
+                continue
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            written += sum(len(future.result()) for future in done)
+            logger.info(f"{written} levels written, {written / (time.perf_counter() - started):.1f} levels/s")
+        for future in pending:
+            written += len(future.result())
+
+    logger.info(f"{written} levels written to {out_dir} in {time.perf_counter() - started:.2f}s")
+    return written
+
+
+def parse_args(args: List[str] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--settings", help="JSON file with map_settings, overridden by the options below")
+    parser.add_argument("--map-height", type=int)
+    parser.add_argument("--map-width", type=int)
+    parser.add_argument("--num-rooms", type=int)
+    parser.add_argument("--min-room-size", type=int)
+    parser.add_argument("--max-room-size", type=int)
+    parser.add_argument("--room-margin", type=int)
+    parser.add_argument("--seeds", type=int, nargs=2, metavar=("FIRST", "STOP"), required=True,
+                        help="generate seeds FIRST up to but not including STOP")
+    parser.add_argument("--workers", type=int, help="worker processes, defaults to the number of cores")
+    parser.add_argument("--chunk-size", type=int, default=16, help="seeds built per task")
+    parser.add_argument("--out", default="levels", help="output directory")
+    return parser.parse_args(args)
+
+
+def map_settings_from_args(args: argparse.Namespace) -> dict:
+    map_settings = dict(DEFAULT_SETTINGS)
+    if args.settings:
+        with open(args.settings) as f:
+            map_settings.update(json.load(f))
+    for key in DEFAULT_SETTINGS:
+        value = getattr(args, key)
+        if value is not None:
+            map_settings[key] = value
+    return map_settings
+
+
+def main(args: List[str] = None):
+    args = parse_args(args)
+    first_seed, last_seed = args.seeds
+    run(map_settings_from_args(args), first_seed, last_seed, args.out, args.workers, args.chunk_size)
+
+
+if __name__ == "__main__":
+    main()
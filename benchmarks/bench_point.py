@@ -0,0 +1,130 @@
+"""
+Micro-benchmarks for Point hashing and the corridor checks that allocate the most Points
+The "before" corridor checks run on a copy of the map stored the way it was before the label grid, one Tile object
+per cell in a numpy object array
+
+Run from the repository root:
+    python -m benchmarks.bench_point
+"""
+import random
+import timeit
+
+import numpy
+
+from dungeon import LABELS
+from enums import Direction, TileType
+from generator import DungeonGenerator
+from point import Point
+from tile import Tile
+
+MAP_SIZE = 201
+REPEAT = 5
+
+
+class XorPoint(Point):
+    """
+    Point with the old x ^ y hash, every point on the diagonal hashes to 0 and (x, y) collides with (y, x)
+    """
+
+    __slots__ = ()
+
+    def __eq__(self, other):
+        return self.x == other.x and self.y == other.y
+
+    def __hash__(self):
+        return self.x ^ self.y
+
+
+class ObjectGridDungeon:
+    """
+    The dungeon as it was stored before the label grid, a numpy object array holding one Tile per cell
+    """
+
+    def __init__(self, dungeon):
+        self.width = dungeon.width
+        self.height = dungeon.height
+        self.tile_grid = numpy.empty(dungeon.grid_shape, dtype=object)
+        for (y, x), code in numpy.ndenumerate(dungeon.label_grid):
+            self.tile_grid[y, x] = Tile.from_label(Point(x, y), LABELS[code])
+
+    def tile(self, point: Point) -> Tile:
+        tile = Tile.empty()
+        if not self.in_bounds(point):
+            tile = Tile.empty(point)
+        try:
+            tile = self.tile_grid[point.y, point.x]
+        except IndexError:
+            pass
+        return tile
+
+    def in_bounds(self, pos: Point) -> bool:
+        return 0 <= pos.x < self.width and 0 <= pos.y < self.height
+
+
+def object_grid_can_carve(dungeon: ObjectGridDungeon, pos: Point, direction: Point) -> bool:
+    """
+    can_carve as it was written before, one Point and one Tile lookup in the object grid per checked cell
+    """
+    xs = (1, 0, -1) if direction.x == 0 else (1 * direction.x, 2 * direction.x)
+    ys = (1, 0, -1) if direction.y == 0 else (1 * direction.y, 2 * direction.y)
+    for x in xs:
+        for y in ys:
+            tile = dungeon.tile(Point(pos.x + x, pos.y + y))
+            if tile.label != TileType.WALL:
+                return False
+    return True
+
+
+def object_grid_possible_moves(dungeon: ObjectGridDungeon, pos: Point) -> list:
+    available_squares = []
+    for direction in [Direction.N.value, Direction.E.value, Direction.S.value, Direction.W.value]:
+        neighbor = pos + direction
+        if not dungeon.in_bounds(neighbor):
+            continue
+        if object_grid_can_carve(dungeon, pos, direction):
+            available_squares.append(neighbor)
+    return available_squares
+
+
+def best_of(statement) -> float:
+    return min(timeit.repeat(statement, number=1, repeat=REPEAT))
+
+
+def report(name: str, before: float, after: float, count: int):
+    print(
+        f"{name:<28} before {before * 1e9 / count:8.1f} ns/op   "
+        f"after {after * 1e9 / count:8.1f} ns/op   speedup x{before / after:5.2f}"
+    )
+
+
+def bench_hashing():
+    diagonal = [(i, i) for i in range(2000)] + [(i, 2000 - i) for i in range(2000)]
+    before = best_of(lambda: set(XorPoint(x, y) for x, y in diagonal))
+    after = best_of(lambda: set(Point(x, y) for x, y in diagonal))
+    report("set of diagonal points", before, after, len(diagonal))
+
+
+def bench_generator():
+    random.seed(0)
+    generator = DungeonGenerator(
+        {"map_height": MAP_SIZE, "map_width": MAP_SIZE, "num_rooms": 60, "seed": 0}
+    )
+    generator.initialize_map()
+    generator.place_random_rooms(5, 11)
+    points = [Point(random.randrange(MAP_SIZE), random.randrange(MAP_SIZE)) for _ in range(5000)]
+    directions = [random.choice(Direction.cardinal()) for _ in points]
+    checks = list(zip(points, directions))
+
+    before_dungeon = ObjectGridDungeon(generator.dungeon)
+    before = best_of(lambda: [object_grid_can_carve(before_dungeon, p, d) for p, d in checks])
+    after = best_of(lambda: [generator.can_carve(p, d) for p, d in checks])
+    report("can_carve", before, after, len(checks))
+
+    before = best_of(lambda: [object_grid_possible_moves(before_dungeon, p) for p in points])
+    after = best_of(lambda: [generator.possible_moves(p) for p in points])
+    report("possible_moves", before, after, len(points))
+
+
+if __name__ == "__main__":
+    bench_hashing()
+    bench_generator()
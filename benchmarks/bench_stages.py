@@ -0,0 +1,240 @@
+"""
+Times every generation stage of DungeonGenerator and the legacy dungeonGenerator at several map sizes
+The legacy generator is only run up to LEGACY_MAX_SIZE, its corridors and path finding take hours on larger maps
+
+Each stage is run in pipeline order on a fixed seed, REPEAT times for wall time keeping the best, and once more
+under tracemalloc for peak memory, since tracing slows allocation heavy code down too much to time it at the same
+time. Results are compared with a JSON baseline and any stage slower or hungrier than the baseline by more than the
+tolerance is flagged.
+
+Run from the repository root:
+    python -m benchmarks.bench_stages                    compare against benchmarks/baseline.json
+    python -m benchmarks.bench_stages --save             record a new baseline
+    python -m benchmarks.bench_stages --sizes 64 256     only some of the sizes
+    python -m benchmarks.bench_stages --large            add the 1024 and 2048 maps
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+import numpy
+
+from typing import Callable, Dict, Iterator, List, Tuple
+
+from dungeonGenerator import dungeonGenerator, EMPTY, OBSTACLE, WALL
+from generator import DungeonGenerator
+from point import Point
+from regions import label_components
+
+SIZES = (64, 256)
+LARGE_SIZES = (1024, 2048)
+LEGACY_MAX_SIZE = 256
+SEED = 1234
+TOLERANCE = 0.25
+REPEAT = 3
+# stages faster than this are too noisy to flag on time alone
+NOISE_FLOOR = 0.005
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), "baseline.json")
+
+MIN_ROOM_SIZE = 5
+MAX_ROOM_SIZE = 11
+# one room for every 400 tiles, with ten attempts per room
+TILES_PER_ROOM = 400
+
+Stage = Tuple[str, Callable[[], object]]
+
+
+def path_endpoints(walkable: numpy.ndarray) -> Tuple[Tuple[int, int], Tuple[int, int]]:
+    """
+    :param walkable: boolean array indexed [y, x]
+    :return: the first and last tile, as (x, y), of the largest group of connected walkable tiles
+    """
+    labels = numpy.full(walkable.shape, -1, dtype=numpy.int32)
+    components = label_components(walkable, labels)
+    if not components:
+        return (0, 0), (0, 0)
+    largest = max(components, key=lambda component: component.size)
+    ys, xs = numpy.nonzero(labels == largest.region)
+    return (int(xs[0]), int(ys[0])), (int(xs[-1]), int(ys[-1]))
+
+
+def generator_stages(size: int) -> Iterator[Stage]:
+    num_rooms = size * size // TILES_PER_ROOM
+    generator = DungeonGenerator(
+        {
+            "map_height": size,
+            "map_width": size,
+            "min_room_size": MIN_ROOM_SIZE,
+            "max_room_size": MAX_ROOM_SIZE,
+            "room_margin": 1,
+            "num_rooms": num_rooms,
+            "seed": SEED,
+        }
+    )
+    dungeon = generator.dungeon
+    yield "initialize_map", generator.initialize_map
+    yield "place_random_rooms", lambda: generator.place_random_rooms(
+        MIN_ROOM_SIZE, MAX_ROOM_SIZE, attempts=num_rooms * 10
+    )
+    yield "build_corridors", generator.build_corridors
+    yield "generate_caves", generator.generate_caves
+    yield "find_unconnected_areas", generator.find_unconnected_areas
+    yield "prune_dead_ends", generator.prune_dead_ends
+    yield "place_walls", dungeon.place_walls
+    yield "construct_nav_graph", lambda: dungeon.nav_graph.build()
+    start, goal = path_endpoints(dungeon.walkable_mask())
+    yield "find_path", lambda: dungeon.find_path(Point(*start), Point(*goal))
+
+
+def legacy_stages(size: int) -> Iterator[Stage]:
+    num_rooms = size * size // TILES_PER_ROOM
+    generator = dungeonGenerator(size, size, seed=SEED)
+    yield "placeRandomRooms", lambda: generator.placeRandomRooms(
+        MIN_ROOM_SIZE, MAX_ROOM_SIZE, attempts=num_rooms * 10
+    )
+    yield "generateCorridors", generator.generateCorridors
+    yield "generateCaves", generator.generateCaves
+    yield "findUnconnectedAreas", generator.findUnconnectedAreas
+    yield "pruneDeadends", generator.pruneDeadends
+    yield "placeWalls", generator.placeWalls
+    yield "constructNavGraph", generator.constructNavGraph
+    walkable = ~numpy.isin(numpy.array(generator.grid), (WALL, EMPTY, OBSTACLE)).T
+    (start_x, start_y), (goal_x, goal_y) = path_endpoints(walkable)
+    yield "findPath", lambda: generator.findPath(start_x, start_y, goal_x, goal_y)
+
+
+IMPLEMENTATIONS = {"generator": generator_stages, "legacy": legacy_stages}
+
+
+def time_stages(stages: Iterator[Stage]) -> Dict[str, float]:
+    seconds = {}
+    for name, stage in stages:
+        started = time.perf_counter()
+        stage()
+        seconds[name] = time.perf_counter() - started
+    return seconds
+
+
+def trace_stages(stages: Iterator[Stage]) -> Dict[str, int]:
+    peaks = {}
+    tracemalloc.start()
+    try:
+        for name, stage in stages:
+            tracemalloc.reset_peak()
+            baseline, _ = tracemalloc.get_traced_memory()
+            stage()
+            peaks[name] = tracemalloc.get_traced_memory()[1] - baseline
+    finally:
+        tracemalloc.stop()
+    return peaks
+
+
+def run(sizes: List[int], implementations: List[str], memory: bool = True, repeat: int = REPEAT) -> Dict[str, dict]:
+    """
+    :return: results keyed "implementation/size/stage", each with seconds, tiles_per_second and peak_bytes
+    :rtype: Dict[str, dict]
+    """
+    results = {}
+    for implementation in implementations:
+        stages = IMPLEMENTATIONS[implementation]
+        for size in sizes:
+            if implementation == "legacy" and size > LEGACY_MAX_SIZE:
+                print(f"skipping legacy/{size}, the legacy generator only runs up to {LEGACY_MAX_SIZE}")
+                continue
+            runs = [time_stages(stages(size)) for _ in range(repeat)]
+            seconds = {name: min(timings[name] for timings in runs) for name in runs[0]}
+            peaks = trace_stages(stages(size)) if memory else {}
+            for name, elapsed in seconds.items():
+                key = f"{implementation}/{size}/{name}"
+                results[key] = {
+                    "seconds": elapsed,
+                    "tiles_per_second": size * size / elapsed if elapsed > 0 else float("inf"),
+                    "peak_bytes": peaks.get(name),
+                }
+                print(
+                    f"{key:<44} {elapsed:10.4f}s {results[key]['tiles_per_second']:14.0f} tiles/s"
+                    + (f" {peaks[name] / 2 ** 20:10.2f} MiB" if name in peaks else "")
+                )
+    return results
+
+
+def find_regressions(results: Dict[str, dict], baseline: Dict[str, dict], tolerance: float) -> List[str]:
+    """
+    :return: a line for every stage whose time or peak memory grew by more than tolerance over the baseline
+    :rtype: List[str]
+    """
+    regressions = []
+    for key, result in results.items():
+        before = baseline.get(key)
+        if before is None:
+            continue
+        for metric in ("seconds", "peak_bytes"):
+            if result.get(metric) is None or not before.get(metric):
+                continue
+            if metric == "seconds" and max(result[metric], before[metric]) < NOISE_FLOOR:
+                continue
+            ratio = result[metric] / before[metric]
+            if ratio > 1 + tolerance:
+                regressions.append(f"{key} {metric}: {before[metric]:.6g} -> {result[metric]:.6g} (x{ratio:.2f})")
+    return regressions
+
+
+def environment() -> dict:
+    return {
+        "python": sys.version.split()[0],
+        "numpy": numpy.__version__,
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "seed": SEED,
+    }
+
+
+def main(args: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="benchmark every generation stage")
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(SIZES))
+    parser.add_argument("--large", action="store_true", help=f"also run {' and '.join(map(str, LARGE_SIZES))}")
+    parser.add_argument(
+        "--implementations", nargs="+", choices=sorted(IMPLEMENTATIONS), default=sorted(IMPLEMENTATIONS)
+    )
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--save", action="store_true", help="write the results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE, help="allowed growth before flagging")
+    parser.add_argument("--no-memory", action="store_true", help="skip the tracemalloc pass")
+    parser.add_argument("--repeat", type=int, default=REPEAT, help="timing runs per size, the best is kept")
+    args = parser.parse_args(args)
+
+    sizes = args.sizes + [size for size in LARGE_SIZES if args.large and size not in args.sizes]
+    results = run(sizes, args.implementations, memory=not args.no_memory, repeat=args.repeat)
+
+    if args.save:
+        stored = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline) as f:
+                stored = json.load(f).get("results", {})
+        stored.update(results)
+        with open(args.baseline, "w") as f:
+            json.dump({"environment": environment(), "results": stored}, f, indent=2, sort_keys=True)
+        print(f"baseline written to {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f"no baseline at {args.baseline}, run with --save to record one")
+        return 0
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    if baseline.get("environment", {}).get("platform") != environment()["platform"]:
+        print("baseline was recorded on a different platform, timings may not be comparable")
+    regressions = find_regressions(results, baseline.get("results", {}), args.tolerance)
+    for line in regressions:
+        print(f"REGRESSION {line}")
+    if not regressions:
+        print(f"no regressions beyond {args.tolerance:.0%}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
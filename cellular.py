@@ -0,0 +1,87 @@
+import numpy
+
+
+def neighbour_count(mask: numpy.ndarray) -> numpy.ndarray:
+    """
+    counts the set cells touching every cell of a 2D mask, diagonals included
+    cells outside the mask count as not set
+
+    :param mask: 2D boolean array
+    :type mask: numpy.ndarray
+    :return: uint8 array the same shape as mask, each value between 0 and 8
+    :rtype: numpy.ndarray
+    """
+    height, width = mask.shape
+    padded = numpy.zeros((height + 2, width + 2), dtype=numpy.uint8)
+    padded[1:-1, 1:-1] = mask
+    counts = numpy.zeros((height, width), dtype=numpy.uint8)
+    for dy in (0, 1, 2):
+        for dx in (0, 1, 2):
+            if dy == dx == 1:
+                continue
+            counts += padded[dy:dy + height, dx:dx + width]
+    return counts
+
+
+def direct_neighbour_count(mask: numpy.ndarray) -> numpy.ndarray:
+    """
+    counts the set cells directly touching every cell of a 2D mask (up, down, left, right)
+    cells outside the mask count as not set
+
+    :param mask: 2D boolean array
+    :type mask: numpy.ndarray
+    :return: uint8 array the same shape as mask, each value between 0 and 4
+    :rtype: numpy.ndarray
+    """
+    height, width = mask.shape
+    padded = numpy.zeros((height + 2, width + 2), dtype=numpy.uint8)
+    padded[1:-1, 1:-1] = mask
+    return (
+        padded[:-2, 1:-1] + padded[2:, 1:-1] + padded[1:-1, :-2] + padded[1:-1, 2:]
+    )
+
+
+def dilate(mask: numpy.ndarray) -> numpy.ndarray:
+    """
+    grows a 2D mask by one cell in all 8 directions
+
+    :param mask: 2D boolean array
+    :type mask: numpy.ndarray
+    :return: boolean array, True where mask or any of its 8 neighbours is set
+    :rtype: numpy.ndarray
+    """
+    return mask | (neighbour_count(mask) > 0)
+
+
+def smooth_caves(grid: numpy.ndarray, cave: int, empty: int, smoothing: int = 4, editable: numpy.ndarray = None):
+    """
+    runs the 4-5 cellular automata rule over a whole grid at once, in place
+    every step the border is cleared, then cells touching 5 or more cave cells become cave
+    and cells touching 2 or fewer become empty, all cells are updated together from the previous step
+
+    :param grid: 2D integer array of tile values
+    :type grid: numpy.ndarray
+    :param cave: value of a cave tile
+    :type cave: int
+    :param empty: value written where cave is removed
+    :type empty: int
+    :param smoothing: number of steps to run
+    :type smoothing: int
+    :param editable: boolean mask of cells the rule may change, every cell if None
+    :type editable: numpy.ndarray
+    """
+    border = numpy.zeros(grid.shape, dtype=bool)
+    border[0, :] = border[-1, :] = border[:, 0] = border[:, -1] = True
+    if editable is not None:
+        border &= editable
+
+    for _ in range(smoothing):
+        grid[border] = empty
+        counts = neighbour_count(grid == cave)
+        grow = counts >= 5
+        shrink = counts <= 2
+        if editable is not None:
+            grow &= editable
+            shrink &= editable
+        grid[grow] = cave
+        grid[shrink] = empty
@@ -0,0 +1,318 @@
+"""
+Chunked dungeons for maps too large to hold in memory
+
+The world is split into square chunks which are generated one at a time, each as a small Dungeon. A chunk only
+depends on its own seed and on the seeds of the four seams around it, so chunks can be generated in any order,
+evicted, and regenerated or reloaded later with the same result:
+
+    chunk seed: SeedSequence(world entropy, spawn_key=(CHUNK_KEY, cx, cy))
+    seam seed:  SeedSequence(world entropy, spawn_key=(SEAM_KEY, cx, cy, axis)), the seam on the right (axis 0) or
+                bottom (axis 1) of chunk (cx, cy)
+
+The outer ring of every chunk stays wall except for the portals of its seams, corridor tiles placed at the same
+position on both sides of a seam, and every room and portal of a chunk is joined to the others with corridors.
+So neighbouring chunks always meet at the same doorways without either having to be resident.
+"""
+import operator
+import os
+
+import numpy
+
+from collections import OrderedDict
+from loguru import logger
+from typing import Iterator, List, Tuple
+
+from dungeon import Dungeon, LABEL_CODES, WALL_CODE
+from enums import TileType
+from generator import DungeonGenerator
+from point import Point
+from storage import load_dungeon, save_dungeon
+
+CHUNK_KEY = 0
+SEAM_KEY = 1
+CAVE_CODE = LABEL_CODES[TileType.CAVE]
+
+DEFAULT_CHUNK_SETTINGS = {
+    "min_room_size": 5,
+    "max_room_size": 11,
+    "room_margin": 1,
+    "num_rooms": 12,
+    "portals": 2,
+    "cave_chance": 0,
+}
+
+
+class Chunk:
+    """
+    Args:
+        cx, cy: position of the chunk in the chunk grid
+        dungeon: tiles of the chunk, in chunk coordinates
+        rooms: int array of (x, y, width, height, region) rows, in chunk coordinates
+
+    Attributes:
+        saved_version: dungeon.version when the chunk was last written or generated, the chunk is dirty once they differ
+    """
+
+    __slots__ = ("cx", "cy", "dungeon", "rooms", "saved_version")
+
+    def __init__(self, cx: int, cy: int, dungeon: Dungeon, rooms: numpy.ndarray):
+        self.cx = cx
+        self.cy = cy
+        self.dungeon = dungeon
+        self.rooms = rooms
+        self.saved_version = dungeon.version
+
+    @property
+    def dirty(self) -> bool:
+        return self.dungeon.version != self.saved_version
+
+
+class ChunkedDungeon:
+    """
+    A dungeon of any size built and kept chunk by chunk, at most max_resident chunks are held in memory at once
+
+    Chunks are generated the first time they are used and, when a directory is given, written to it straight away.
+    Once the window is full the least recently used chunk is evicted: clean chunks are simply dropped, dirty ones
+    are written first. Without a directory clean chunks are regenerated from their seed when needed again, and dirty
+    chunks are kept resident since their changes could not be recovered.
+
+    Args:
+        height, width: size of the world in tiles
+        chunk_size: width and height of a chunk, chunks on the right and bottom edge may be smaller
+        seed: world seed, an int or None for fresh entropy
+        directory: where chunks are stored as dungeon files, chunks are not stored if None
+        max_resident: number of chunks kept in memory
+        map_settings: room sizes, margin, rooms per chunk, portals per seam and cave_chance, see DEFAULT_CHUNK_SETTINGS
+
+    Attributes:
+        chunks: OrderedDict of the resident chunks by (cx, cy), least recently used first
+    """
+
+    def __init__(
+        self,
+        height: int,
+        width: int,
+        chunk_size: int = 256,
+        seed: int = None,
+        directory: str = None,
+        max_resident: int = 16,
+        map_settings: dict = None,
+    ):
+        self.height = height
+        self.width = width
+        self.chunk_size = chunk_size
+        self.chunks_x = -(-width // chunk_size)
+        self.chunks_y = -(-height // chunk_size)
+        self.entropy = numpy.random.SeedSequence(seed).entropy
+        self.directory = directory
+        self.max_resident = max_resident
+        self.map_settings = dict(DEFAULT_CHUNK_SETTINGS, **(map_settings or {}))
+        self.chunks = OrderedDict()
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+
+    def chunk_shape(self, cx: int, cy: int) -> Tuple[int, int]:
+        return (
+            min(self.chunk_size, self.height - cy * self.chunk_size),
+            min(self.chunk_size, self.width - cx * self.chunk_size),
+        )
+
+    def chunk_path(self, cx: int, cy: int) -> str:
+        return os.path.join(self.directory, f"chunk_{cx}_{cy}.dgn")
+
+    def seam_portals(self, cx: int, cy: int, axis: int) -> numpy.ndarray:
+        """
+        Positions along the right (axis 0) or bottom (axis 1) seam of chunk (cx, cy) where a corridor crosses
+        Both chunks of the seam get the same positions since they only depend on the seam's seed
+        :return: sorted int array of offsets along the seam, in chunk coordinates
+        :rtype: numpy.ndarray
+        """
+        height, width = self.chunk_shape(cx, cy)
+        length = height if axis == 0 else width
+        # keep portals clear of the corners so they never land on the seam running the other way
+        choices = numpy.arange(2, length - 2)
+        if len(choices) == 0:
+            return choices
+        rng = numpy.random.default_rng(numpy.random.SeedSequence(self.entropy, spawn_key=(SEAM_KEY, cx, cy, axis)))
+        count = min(self.map_settings["portals"], len(choices))
+        return numpy.sort(rng.choice(choices, count, replace=False))
+
+    def portals(self, cx: int, cy: int) -> List[Point]:
+        """
+        :return: every portal tile on the outer ring of chunk (cx, cy), in chunk coordinates
+        :rtype: List[Point]
+        """
+        height, width = self.chunk_shape(cx, cy)
+        portals = []
+        if cx + 1 < self.chunks_x:
+            portals += [Point(width - 1, int(y)) for y in self.seam_portals(cx, cy, 0)]
+        if cx > 0:
+            portals += [Point(0, int(y)) for y in self.seam_portals(cx - 1, cy, 0)]
+        if cy + 1 < self.chunks_y:
+            portals += [Point(int(x), height - 1) for x in self.seam_portals(cx, cy, 1)]
+        if cy > 0:
+            portals += [Point(int(x), 0) for x in self.seam_portals(cx, cy - 1, 1)]
+        return portals
+
+    def generate_chunk(self, cx: int, cy: int) -> Chunk:
+        """
+        Builds chunk (cx, cy) from its seed: rooms, then caves, then corridors joining every room and portal
+        """
+        height, width = self.chunk_shape(cx, cy)
+        settings = self.map_settings
+        sequence = numpy.random.SeedSequence(self.entropy, spawn_key=(CHUNK_KEY, cx, cy))
+        generator = DungeonGenerator(dict(settings, map_height=height, map_width=width, seed=sequence))
+        generator.initialize_map()
+        generator.place_random_rooms(
+            min_room_size=settings["min_room_size"],
+            max_room_size=settings["max_room_size"],
+            margin=settings["room_margin"],
+        )
+        if settings["cave_chance"]:
+            # smooth_caves clears the outer ring every step, so caves never reach a seam
+            generator.generate_caves(settings["cave_chance"])
+
+        nodes = [Point(room.x + room.width // 2, room.y + room.height // 2) for room in generator.rooms]
+        for portal in self.portals(cx, cy):
+            carve_corridor(generator.dungeon, portal.x, portal.y, 1, 1)
+            # portals are joined from the tile just inside them, so no corridor ever runs along the outer ring
+            nodes.append(Point(min(max(portal.x, 1), width - 2), min(max(portal.y, 1), height - 2)))
+        connect_points(generator.dungeon, nodes, generator.np_random)
+
+        rooms = numpy.array(
+            [(room.x, room.y, room.width, room.height, room.region) for room in generator.rooms], dtype=numpy.int32
+        ).reshape(-1, 5)
+        return Chunk(cx, cy, generator.dungeon, rooms)
+
+    def chunk(self, cx: int, cy: int) -> Chunk:
+        """
+        Returns chunk (cx, cy), loading or generating it if it is not resident, evicting others to make room
+        :rtype: Chunk
+        :raises IndexError: if there is no such chunk
+        """
+        if not (0 <= cx < self.chunks_x and 0 <= cy < self.chunks_y):
+            raise IndexError(f"chunk ({cx}, {cy}) is outside the {self.chunks_x}x{self.chunks_y} chunks of the world")
+        key = (cx, cy)
+        chunk = self.chunks.get(key)
+        if chunk is not None:
+            self.chunks.move_to_end(key)
+            return chunk
+
+        if self.directory is not None and os.path.exists(self.chunk_path(cx, cy)):
+            # copy on write, changes stay in memory until the chunk is saved
+            stored = load_dungeon(self.chunk_path(cx, cy), mode="c")
+            chunk = Chunk(cx, cy, stored.dungeon, stored.rooms)
+        else:
+            chunk = self.generate_chunk(cx, cy)
+            if self.directory is not None:
+                self.save_chunk(chunk)
+
+        self.chunks[key] = chunk
+        self.evict()
+        return chunk
+
+    def save_chunk(self, chunk: Chunk):
+        """
+        Writes a chunk next to its old file and renames it into place, a resident memory map of the old file is
+        left untouched
+        """
+        path = self.chunk_path(chunk.cx, chunk.cy)
+        save_dungeon(path + ".partial", chunk.dungeon, chunk.rooms)
+        os.replace(path + ".partial", path)
+        chunk.saved_version = chunk.dungeon.version
+
+    def evict(self):
+        """
+        Drops least recently used chunks until at most max_resident are resident, dirty chunks are written first
+        """
+        if len(self.chunks) <= self.max_resident:
+            return
+        for key in list(self.chunks):
+            if len(self.chunks) <= self.max_resident:
+                break
+            chunk = self.chunks[key]
+            if chunk.dirty:
+                if self.directory is None:
+                    continue
+                self.save_chunk(chunk)
+            del self.chunks[key]
+        if len(self.chunks) > self.max_resident:
+            logger.warning(f"{len(self.chunks)} chunks resident, dirty chunks are kept since there is no directory")
+
+    def flush(self):
+        """
+        Writes every dirty resident chunk
+        """
+        if self.directory is None:
+            return
+        for chunk in self.chunks.values():
+            if chunk.dirty:
+                self.save_chunk(chunk)
+
+    def generate(self) -> Iterator[Tuple[int, int]]:
+        """
+        Generates every chunk that is not stored yet, row by row, streaming each to the directory
+        Yields the position of every chunk as it is finished, memory stays bounded by max_resident throughout
+        """
+        for cy in range(self.chunks_y):
+            for cx in range(self.chunks_x):
+                if self.directory is None or not os.path.exists(self.chunk_path(cx, cy)):
+                    self.chunk(cx, cy)
+                yield cx, cy
+
+    def locate(self, point: Point) -> Tuple[Chunk, Point]:
+        """
+        :return: the chunk holding point and the position of point inside it
+        :rtype: Tuple[Chunk, Point]
+        :raises IndexError: if point is outside the world
+        :raises TypeError: if the coordinates are not integers
+        """
+        x, y = operator.index(point.x), operator.index(point.y)
+        if not self.in_bounds(point):
+            raise IndexError(f"{point} is outside the {self.width}x{self.height} world")
+        cx, x = divmod(x, self.chunk_size)
+        cy, y = divmod(y, self.chunk_size)
+        return self.chunk(cx, cy), Point(x, y)
+
+    def label(self, point: Point) -> TileType:
+        chunk, local = self.locate(point)
+        return chunk.dungeon.label(local)
+
+    def set_tile(self, point: Point, label: TileType):
+        chunk, local = self.locate(point)
+        chunk.dungeon.set_tile(local, label)
+
+    def in_bounds(self, pos: Point) -> bool:
+        return 0 <= pos.x < self.width and 0 <= pos.y < self.height
+
+
+def carve_corridor(dungeon: Dungeon, x: int, y: int, width: int, height: int):
+    """
+    Turns the wall and cave tiles of a rectangle into corridor, rooms it passes through are left as they are
+    """
+    area = dungeon.label_grid[y:y + height, x:x + width]
+    dungeon.set_tiles((area == WALL_CODE) | (area == CAVE_CODE), TileType.CORRIDOR, x=x, y=y)
+
+
+def connect_points(dungeon: Dungeon, points: List[Point], rng: numpy.random.Generator):
+    """
+    Joins every point to the nearest point before it with an L shaped corridor, so they all end up connected
+    :param dungeon: dungeon to carve in
+    :type dungeon: Dungeon
+    :param points: tiles to connect
+    :type points: List[Point]
+    :param rng: picks which leg of each corridor comes first
+    :type rng: numpy.random.Generator
+    """
+    if not points:
+        return
+    xs = numpy.array([point.x for point in points])
+    ys = numpy.array([point.y for point in points])
+    carve_corridor(dungeon, xs[0], ys[0], 1, 1)
+    for i in range(1, len(points)):
+        j = int(numpy.argmin(numpy.abs(xs[:i] - xs[i]) + numpy.abs(ys[:i] - ys[i])))
+        x0, y0, x1, y1 = int(xs[i]), int(ys[i]), int(xs[j]), int(ys[j])
+        # the bend is either at (x1, y0) or (x0, y1)
+        bend_x, bend_y = (x1, y0) if rng.integers(2) else (x0, y1)
+        carve_corridor(dungeon, min(x0, bend_x), min(y0, bend_y), abs(x0 - bend_x) + 1, abs(y0 - bend_y) + 1)
+        carve_corridor(dungeon, min(x1, bend_x), min(y1, bend_y), abs(x1 - bend_x) + 1, abs(y1 - bend_y) + 1)
@@ -1,21 +1,95 @@
 import numpy
 
 from loguru import logger
+from typing import List, Optional
 
+from cellular import dilate
 from enums import TileType
+from integral import SummedAreaTable
+from navgraph import NavGraph
+from pathfinding import DistanceField, FlowFieldCache, PathFinder
 from point import Point
+from regions import label_components
 from tile import Tile
 
+# side of the square blocks of tiles tracked by Dungeon.dirty_chunks
+DIRTY_CHUNK_SIZE = 16
+
+# every TileType is stored in the label grid as its index in this tuple
+LABELS = tuple(TileType)
+LABEL_CODES = {label: code for code, label in enumerate(LABELS)}
+WALL_CODE = LABEL_CODES[TileType.WALL]
+PASSABLE = numpy.array([Tile.shared(label).passable for label in LABELS], dtype=bool)
+SHARED_TILES_BY_CODE = tuple(Tile.shared(label) for label in LABELS)
+# tiles an agent can stand on, unlike PASSABLE this includes doors
+WALKABLE = numpy.array(
+    [label in (TileType.FLOOR, TileType.CORRIDOR, TileType.DOOR, TileType.CAVE) for label in LABELS], dtype=bool
+)
+
 
 class Dungeon:
-    def __init__(self, height: int, width: int):
+    """
+    Stores the map as parallel typed arrays instead of a grid of Tile objects
+
+    Attributes:
+        label_grid: uint8 array of label codes, indices into LABELS
+        region_grid: int32 array of region numbers, -1 if the tile has no region
+        passable_grid: bool array, True where the tile can be walked through
+        occupancy: summed area table of every tile that is not a wall, rebuilt lazily after set_tile
+        version: increases every time a label or region changes, used to know when cached searches are stale
+        dirty_chunks: bool array with one entry per DIRTY_CHUNK_SIZE square of tiles, True once a label or region in
+            it changes, read and cleared by pop_dirty_rects() so a viewer only redraws what changed
+    """
+
+    def __init__(
+        self,
+        height: int,
+        width: int,
+        label_grid: numpy.ndarray = None,
+        region_grid: numpy.ndarray = None,
+        passable_grid: numpy.ndarray = None,
+    ):
         self.height = height
         self.width = width
         self.rooms = []
 
         self.grid_shape = (height, width)
-        self.tile_grid = numpy.full(shape=self.grid_shape, fill_value=Tile.empty())
-        self.region_grid = numpy.full(shape=self.grid_shape, fill_value=-1, dtype=int)
+        if label_grid is None:
+            label_grid = numpy.full(shape=self.grid_shape, fill_value=LABEL_CODES[TileType.EMPTY], dtype=numpy.uint8)
+        if region_grid is None:
+            region_grid = numpy.full(shape=self.grid_shape, fill_value=-1, dtype=numpy.int32)
+        if passable_grid is None:
+            passable_grid = PASSABLE[label_grid]
+        self.label_grid = label_grid
+        self.region_grid = region_grid
+        self.passable_grid = passable_grid
+
+        self._occupancy = None
+        self._occupancy_stale = True
+        self._path_finder = None
+        self._flow_fields = None
+        self._nav_graph = None
+        self.version = 0
+        self.dirty_chunks = numpy.ones(
+            (-(-height // DIRTY_CHUNK_SIZE), -(-width // DIRTY_CHUNK_SIZE)), dtype=bool
+        )
+
+    @classmethod
+    def from_arrays(
+        cls, label_grid: numpy.ndarray, region_grid: numpy.ndarray = None, passable_grid: numpy.ndarray = None
+    ) -> "Dungeon":
+        """
+        Wraps existing grids, such as memory maps of a saved dungeon, without copying them
+        :param label_grid: uint8 array of label codes
+        :type label_grid: numpy.ndarray
+        :param region_grid: int32 array of regions, -1 everywhere if None
+        :type region_grid: numpy.ndarray
+        :param passable_grid: bool array, derived from label_grid if None
+        :type passable_grid: numpy.ndarray
+        :rtype: Dungeon
+        """
+        height, width = label_grid.shape
+        return cls(height, width, label_grid, region_grid, passable_grid)
 
     @property
     def rows(self):
@@ -26,35 +100,303 @@ class Dungeon:
         return range(self.width)
 
     def __iter__(self):
+        """
+        Yields every position with its shared Tile, the tile itself carries no position
+        """
         for row in self.rows:
             for col in self.columns:
-                yield Point(col, row), self.tile_grid[row, col]
+                yield Point(col, row), SHARED_TILES_BY_CODE[self.label_grid[row, col]]
 
     def clear_dungeon(self):
         """
-        Clears the dungeon data by filling the tile grid with empty tiles and region grid with -1
+        Clears the dungeon data by filling the label grid with empty tiles and region grid with -1
         """
-        self.tile_grid = numpy.full(shape=self.grid_shape, fill_value=Tile.empty())
-        self.region_grid = numpy.full(shape=self.grid_shape, fill_value=-1, dtype=int)
+        self.label_grid.fill(LABEL_CODES[TileType.EMPTY])
+        self.region_grid.fill(-1)
+        self.passable_grid.fill(False)
+        self._occupancy_stale = True
+        self._nav_graph = None
+        self.dirty_chunks.fill(True)
+        self.version += 1
 
-    def tile(self, point: Point) -> Tile:
-        tile = Tile.empty()
+    def tile(self, point: Point, shared: bool = False) -> Tile:
+        """
+        Builds a Tile for the point from the label grid, tiles are not stored so a new one is created for every call
+        unless shared is True, then the flyweight Tile for the label is returned instead
+        :param point: position of the tile
+        :type point: Point
+        :param shared: return the shared Tile for the label, which has no position
+        :type shared: bool
+        :return: Tile at point, or an empty Tile if point is outside the dungeon
+        :rtype: Tile
+        """
         if not self.in_bounds(point):
-            tile = Tile.empty(point)
-        try:
-            tile = self.tile_grid[point.y, point.x]
-        except IndexError:
-            print("index out of range")
-        return tile
+            return Tile.shared(TileType.EMPTY) if shared else Tile.empty(point)
+        if shared:
+            return SHARED_TILES_BY_CODE[self.label_grid[point.y, point.x]]
+        return Tile.from_label(point, self.label(point))
+
+    def label(self, point: Point) -> TileType:
+        return LABELS[self.label_grid[point.y, point.x]]
 
     def set_tile(self, point: Point, label: TileType):
-        self.tile_grid[point.y, point.x] = Tile.from_label(point, label)
+        code = LABEL_CODES[label]
+        self.label_grid[point.y, point.x] = code
+        self.passable_grid[point.y, point.x] = PASSABLE[code]
+        if self._nav_graph is not None:
+            self._nav_graph.update(point.x, point.y, WALKABLE[code][None, None])
+        self.dirty_chunks[point.y // DIRTY_CHUNK_SIZE, point.x // DIRTY_CHUNK_SIZE] = True
+        self._occupancy_stale = True
+        self.version += 1
+
+    def fill_rect(self, x: int, y: int, width: int, height: int, label: TileType, region: int = None):
+        """
+        Sets every tile in a rectangle to label in a single array assignment, the rectangle is clipped to the dungeon
+        The occupancy table is updated incrementally when the rectangle was all walls or all non-walls before
+        :param x: left column of the rectangle
+        :type x: int
+        :param y: top row of the rectangle
+        :type y: int
+        :param width: number of columns the rectangle spans
+        :type width: int
+        :param height: number of rows the rectangle spans
+        :type height: int
+        :param label: label for every tile in the rectangle
+        :type label: TileType
+        :param region: region for every tile in the rectangle, regions are left untouched if None
+        :type region: int
+        """
+        # clip to the dungeon, a rectangle hanging off the map only changes the tiles on it
+        right = min(x + width, self.width)
+        bottom = min(y + height, self.height)
+        x = max(x, 0)
+        y = max(y, 0)
+        width = right - x
+        height = bottom - y
+        if width <= 0 or height <= 0:
+            return
+        code = LABEL_CODES[label]
+        area = (slice(y, y + height), slice(x, x + width))
+        if not self._occupancy_stale:
+            occupied = self._occupancy.count(x, y, width, height)
+            if code == WALL_CODE and occupied == width * height:
+                self._occupancy.add_rect(x, y, width, height, -1)
+            elif code != WALL_CODE and occupied == 0:
+                self._occupancy.add_rect(x, y, width, height, 1)
+            elif 0 < occupied < width * height:
+                self._occupancy_stale = True
+
+        self.label_grid[area] = code
+        self.passable_grid[area] = PASSABLE[code]
+        if region is not None:
+            self.region_grid[area] = region
+        if self._nav_graph is not None:
+            self._nav_graph.update(x, y, numpy.full((height, width), WALKABLE[code]))
+        self.mark_dirty(x, y, width, height)
+        self.version += 1
+
+    def set_tiles(self, mask: numpy.ndarray, label: TileType, region: int = None, x: int = 0, y: int = 0):
+        """
+        Sets every tile where mask is True to label in a single array assignment
+        :param mask: boolean array the same shape as the dungeon, or a smaller window of it placed at (x, y)
+        :type mask: numpy.ndarray
+        :param label: label for every selected tile
+        :type label: TileType
+        :param region: region for every selected tile, or an int array the same shape as mask to copy the
+            regions of the selected tiles from, regions are left untouched if None
+        :type region: int
+        :param x: left column of the window mask covers
+        :type x: int
+        :param y: top row of the window mask covers
+        :type y: int
+        """
+        height, width = mask.shape
+        area = (slice(y, y + height), slice(x, x + width))
+        code = LABEL_CODES[label]
+        self.label_grid[area][mask] = code
+        self.passable_grid[area][mask] = PASSABLE[code]
+        if isinstance(region, numpy.ndarray):
+            self.region_grid[area][mask] = region[mask]
+        elif region is not None:
+            self.region_grid[area][mask] = region
+        if self._nav_graph is not None:
+            ys, xs = numpy.nonzero(mask)
+            self._nav_graph.update_cells(xs + x, ys + y, WALKABLE[code])
+        if mask.shape == self.grid_shape:
+            self.mark_dirty_mask(mask)
+        else:
+            ys, xs = numpy.nonzero(mask)
+            self.mark_dirty_cells(xs + x, ys + y)
+        self._occupancy_stale = True
+        self.version += 1
+
+    def set_cells(self, xs: numpy.ndarray, ys: numpy.ndarray, label: TileType, region: int = None):
+        """
+        Sets a list of scattered tiles to label, writing only those tiles and marking only their chunks dirty
+        :param xs: columns of the tiles
+        :type xs: numpy.ndarray
+        :param ys: rows of the tiles, the same length as xs
+        :type ys: numpy.ndarray
+        :param label: label for every tile
+        :type label: TileType
+        :param region: region for every tile, or an int array with the region of each, untouched if None
+        :type region: int
+        """
+        if not len(xs):
+            return
+        code = LABEL_CODES[label]
+        self.label_grid[ys, xs] = code
+        self.passable_grid[ys, xs] = PASSABLE[code]
+        if region is not None:
+            self.region_grid[ys, xs] = region
+        if self._nav_graph is not None:
+            self._nav_graph.update_cells(xs, ys, WALKABLE[code])
+        self.mark_dirty_cells(xs, ys)
+        self._occupancy_stale = True
+        self.version += 1
+
+    def mark_dirty(self, x: int, y: int, width: int, height: int):
+        """
+        Flags every dirty chunk a rectangle of tiles touches
+        """
+        if width <= 0 or height <= 0:
+            return
+        self.dirty_chunks[
+            max(y, 0) // DIRTY_CHUNK_SIZE:(y + height - 1) // DIRTY_CHUNK_SIZE + 1,
+            max(x, 0) // DIRTY_CHUNK_SIZE:(x + width - 1) // DIRTY_CHUNK_SIZE + 1,
+        ] = True
+
+    def mark_dirty_mask(self, mask: numpy.ndarray):
+        """
+        Flags every dirty chunk holding a True tile of mask, the mask is reduced block by block in one pass
+        """
+        rows, columns = self.dirty_chunks.shape
+        padded = numpy.zeros((rows * DIRTY_CHUNK_SIZE, columns * DIRTY_CHUNK_SIZE), dtype=bool)
+        padded[:self.height, :self.width] = mask
+        self.dirty_chunks |= padded.reshape(rows, DIRTY_CHUNK_SIZE, columns, DIRTY_CHUNK_SIZE).any(axis=(1, 3))
+
+    def mark_dirty_cells(self, xs: numpy.ndarray, ys: numpy.ndarray):
+        """
+        Flags the dirty chunk of every listed tile, for a few scattered tiles where a full map mask would cost more
+        """
+        self.dirty_chunks[numpy.asarray(ys) // DIRTY_CHUNK_SIZE, numpy.asarray(xs) // DIRTY_CHUNK_SIZE] = True
+
+    def pop_dirty_rects(self) -> List[tuple]:
+        """
+        Returns the changed parts of the dungeon and clears the dirty chunks
+        Neighbouring dirty chunks in a row are joined, so a fully dirty dungeon gives one rectangle per chunk row
+        :return: (x, y, width, height) of every changed rectangle, in tiles and clipped to the dungeon
+        :rtype: List[tuple]
+        """
+        rects = []
+        for row, columns in enumerate(self.dirty_chunks):
+            if not columns.any():
+                continue
+            # starts and ends of the runs of dirty chunks in this row
+            edges = numpy.flatnonzero(numpy.diff(numpy.concatenate(([False], columns, [False])).astype(numpy.int8)))
+            y = row * DIRTY_CHUNK_SIZE
+            height = min(DIRTY_CHUNK_SIZE, self.height - y)
+            for start, end in zip(edges[::2].tolist(), edges[1::2].tolist()):
+                x = start * DIRTY_CHUNK_SIZE
+                rects.append((x, y, min(end * DIRTY_CHUNK_SIZE, self.width) - x, height))
+        self.dirty_chunks.fill(False)
+        return rects
+
+    def walkable_mask(self) -> numpy.ndarray:
+        """
+        :return: boolean array, True for floor, corridor, door and cave tiles
+        :rtype: numpy.ndarray
+        """
+        return WALKABLE[self.label_grid]
+
+    def place_walls(self):
+        """
+        Turns every empty tile touching a walkable tile, diagonals included, into a wall
+        The walls are the dilation of the walkable mask minus the mask itself, set in one assignment
+        """
+        walkable = self.walkable_mask()
+        self.set_tiles(dilate(walkable) & (self.label_grid == LABEL_CODES[TileType.EMPTY]), TileType.WALL)
+
+    def label_regions(self, mask: numpy.ndarray = None, first_region: int = 0, diagonal: bool = False):
+        """
+        Writes a region number into region_grid for every group of connected tiles in mask
+        Tiles outside mask keep their region
+        :param mask: boolean array of tiles to group, walkable tiles if None
+        :type mask: numpy.ndarray
+        :param first_region: region number of the first group found
+        :type first_region: int
+        :param diagonal: if True tiles touching only at a corner are connected as well
+        :type diagonal: bool
+        :return: a Component with the size and bounding box of every group
+        :rtype: List[Component]
+        """
+        if mask is None:
+            mask = self.walkable_mask()
+        self.mark_dirty_mask(mask)
+        self.version += 1
+        return label_components(mask, self.region_grid, first_region, diagonal)
+
+    def find_path(self, start: Point, goal: Point) -> Optional[List[Point]]:
+        """
+        Finds a shortest path between two walkable tiles with A*, see pathfinding.PathFinder
+        :return: the path from goal back to start, both included, or None if goal cannot be reached
+        :rtype: List[Point]
+        """
+        return self.path_finder.find_path(start, goal)
+
+    def distance_field(self, target: Point) -> Optional[DistanceField]:
+        """
+        Distances and next steps from every tile to target, cached until the dungeon changes
+        Agents sharing a target should each call next_step() on the same field instead of searching on their own
+        :param target: tile every agent is heading to
+        :type target: Point
+        :return: the distance field for target, None if target is off the map or not walkable
+        :rtype: DistanceField
+        """
+        if self._flow_fields is None:
+            self._flow_fields = FlowFieldCache(self.path_finder)
+        return self._flow_fields.field(target)
+
+    @property
+    def path_finder(self) -> PathFinder:
+        if self._path_finder is None:
+            self._path_finder = PathFinder(self)
+        return self._path_finder
+
+    @property
+    def nav_graph(self) -> NavGraph:
+        """
+        CSR graph of the walkable tiles, built on first use, every tile change then updates the links of the cells
+        around it and the CSR arrays are rebuilt from the links on the next read, see navgraph.NavGraph
+        """
+        if self._nav_graph is None:
+            self._nav_graph = NavGraph.from_dungeon(self)
+        return self._nav_graph
+
+    @property
+    def occupancy(self) -> SummedAreaTable:
+        if self._occupancy is None:
+            self._occupancy = SummedAreaTable(self.label_grid != WALL_CODE)
+        elif self._occupancy_stale:
+            self._occupancy.rebuild(self.label_grid != WALL_CODE)
+        self._occupancy_stale = False
+        return self._occupancy
+
+    def occupied_count(self, x: int, y: int, width: int, height: int) -> int:
+        """
+        Counts the tiles in a rectangle that are not walls in O(1), the rectangle must be within the dungeon
+        :return: number of tiles that are not walls
+        :rtype: int
+        """
+        return self.occupancy.count(x, y, width, height)
 
     def region(self, point: Point) -> int:
         return self.region_grid[point.y, point.x]
 
     def set_region(self, point: Point, region: int):
         self.region_grid[point.y, point.x] = region
+        self.dirty_chunks[point.y // DIRTY_CHUNK_SIZE, point.x // DIRTY_CHUNK_SIZE] = True
+        self.version += 1
 
     def in_bounds(self, pos: Point) -> bool:
         """
@@ -13,7 +13,17 @@
 ##################################################################
 
 
-from random import randint, choice, randrange
+from collections import deque
+
+import numpy
+import random
+
+from cellular import dilate, smooth_caves
+from growingtree import CellList
+from integral import SummedAreaTable
+from navgraph import NavGraph
+from regions import label_components
+from seeding import make_random, seed_sequence
 
 # tile constants
 EMPTY = 0
@@ -80,6 +90,8 @@ class dungeonGenerator:
 
     Args:
         height and width of the dungeon to be generated
+        seed: optional int or numpy SeedSequence, when given every random choice comes from the generators own streams
+            so the same seed always builds the same dungeon, otherwise the global random module is used as before
 
     Attributes:
         width: size of the dungeon in the x dimension
@@ -89,12 +101,15 @@ class dungeonGenerator:
         doors: **list of all grid coordinates of the corridor to room connections, elements are tuples (x,y), empty until connectAllRooms() is called
         corridors: **list of all the corridor tiles in the grid, elements are tuples (x,y), empty until generateCorridors() is called
         deadends: list of all corridor tiles only connected to one other tile, elements are tuples (x,y), empty until findDeadends() is called
-        graph: dictionary where keys are the coordinates of all floor/corridor tiles and values are a list of floor/corridor directly connected, ie (x, y): [(x+1, y), (x-1, y), (x, y+1), (x, y-1)], empty until constructGraph() is called
+        random: random.Random used for every random choice, seeded from the random module when no seed was given
+        npRandom: numpy Generator used for the cave noise
+        navGraph: NavGraph of the floor/corridor tiles in CSR form over the cell ids y * width + x, None until constructNavGraph() is called
+        graph: read only dictionary view of navGraph where keys are the coordinates of all floor/corridor tiles and values are a list of floor/corridor directly connected, ie (x, y): [(x, y-1), (x, y+1), (x-1, y), (x+1, y)], built when first read, empty until constructNavGraph() is called
 
         ** once created these will not be re-instanced, therefore any user made changes to grid will also need to update these lists for them to remain valid
     """
 
-    def __init__(self, height, width):
+    def __init__(self, height, width, seed=None):
 
         self.height = abs(height)
         self.width = abs(width)
@@ -105,7 +120,15 @@ class dungeonGenerator:
         self.corridors = []
         self.deadends = []
 
-        self.graph = {}
+        self.navGraph = None
+        self._graph = None
+
+        if seed is None:
+            # a private stream drawn from the global one, random.seed() still reproduces the level
+            self.random = random.Random(random.getrandbits(64))
+            self.npRandom = None
+        else:
+            self.random, self.npRandom = make_random(seed_sequence(seed))
 
     def __iter__(self):
         for xi in range(self.width):
@@ -193,7 +216,7 @@ class dungeonGenerator:
                 availableSquares.append((nx, ny))
         return availableSquares
 
-    def quadFits(self, sx, sy, rx, ry, margin):
+    def quadFits(self, sx, sy, rx, ry, margin, occupied=None):
         """
         looks to see if a quad shape will fit in the grid without colliding with any other tiles
         used by placeRoom() and placeRandomRooms()
@@ -202,6 +225,8 @@ class dungeonGenerator:
             sx and sy: integer, the bottom left coords of the quad to check
             rx and ry: integer, the width and height of the quad, where rx > sx and ry > sy
             margin: integer, the space in grid cells (ie, 0 = no cells, 1 = 1 cell, 2 = 2 cells) to be away from other tiles on the grid
+            occupied: SummedAreaTable of the non empty tiles indexed [y, x], built from the grid if None,
+                      pass one in and keep it updated when checking many quads so each check is O(1)
 
         returns:
             True if the quad fits
@@ -212,13 +237,18 @@ class dungeonGenerator:
         rx += margin * 2
         ry += margin * 2
         if sx + rx < self.width and sy + ry < self.height and sx >= 0 and sy >= 0:
-            for x in range(rx):
-                for y in range(ry):
-                    if self.grid[sx + x][sy + y]:
-                        return False
-            return True
+            if occupied is None:
+                occupied = self.occupancyTable()
+            return occupied.count(sx, sy, rx, ry) == 0
         return False
 
+    def occupancyTable(self):
+        """
+        Returns:
+            a SummedAreaTable of the non empty tiles of the grid, indexed [y, x] while the grid is grid[x][y]
+        """
+        return SummedAreaTable(numpy.array(self.grid, dtype=bool).T)
+
     def floodFill(self, x, y, fillWith, tilesToFill=[], grid=None):
         """
         Fills tiles connected to the starting tile
@@ -281,7 +311,8 @@ class dungeonGenerator:
     def findUnconnectedAreas(self):
         """
         Checks through the grid to find islands/unconnected rooms
-        Note, this can be slow for large grids and memory intensive since it needs to create a deep copy of the grid
+        The grid is copied into a boolean array once and labelled with regions.label_components(), which works on
+        runs of tiles rather than flood filling every tile
         in order to use joinUnconnectedAreas() this needs to be called first and the returned list passed to joinUnconnectedAreas()
 
         Args:
@@ -291,24 +322,19 @@ class dungeonGenerator:
             A list of unconnected cells, where each group of cells is in its own list and each cell indice is stored as a tuple, ie [[(x1,y1), (x2,y2), (x3,y3)], [(xi1,yi1), (xi2,yi2), (xi3,yi3)]]
         """
 
+        # indexed [x, y] like the grid, so areas and their cells come out in the same x then y order as before
+        labels = numpy.full((self.width, self.height), -1, dtype=numpy.int32)
+        components = label_components(numpy.array(self.grid, dtype=bool), labels)
+        flatLabels = labels.ravel()
+        cells = numpy.flatnonzero(flatLabels >= 0)
+        cells = cells[numpy.argsort(flatLabels[cells], kind="stable")]
+        xs, ys = numpy.divmod(cells, self.height)
         unconnectedAreas = []
-        areaCount = 0
-        gridCopy = [[EMPTY for i in range(self.width)] for i in range(self.height)]
-        for x in range(self.width):
-            for y in range(self.height):
-                if self.grid[x][y]:
-                    gridCopy[x][y] = "x"
-        for x in range(self.width):
-            for y in range(self.height):
-                if gridCopy[x][y] == "x":
-                    unconnectedAreas.append([])
-                    areaCount += 1
-                    self.floodFill(x, y, areaCount, None, gridCopy)
-        for x in range(self.width):
-            for y in range(self.height):
-                if gridCopy[x][y]:
-                    i = gridCopy[x][y]
-                    unconnectedAreas[i - 1].append((x, y))
+        start = 0
+        for component in components:
+            end = start + component.size
+            unconnectedAreas.append(list(zip(xs[start:end].tolist(), ys[start:end].tolist())))
+            start = end
         return unconnectedAreas
 
     def findDeadends(self):
@@ -360,6 +386,7 @@ class dungeonGenerator:
         """
         randomly places quads in the grid
         takes a brute force approach: randomly a generate quad in a random place -> check if fits -> reject if not
+        fits are checked in O(1) against a summed area table of the grid that is updated as rooms are placed
         Populates self.rooms
 
         Args:
@@ -373,20 +400,23 @@ class dungeonGenerator:
             none
         """
 
+        occupied = self.occupancyTable()
         for attempt in range(attempts):
-            roomWidth = randrange(minRoomSize, maxRoomSize, roomStep)
-            roomHeight = randrange(minRoomSize, maxRoomSize, roomStep)
-            startX = randint(0, self.width)
-            startY = randint(0, self.height)
-            if self.quadFits(startX, startY, roomWidth, roomHeight, margin):
+            roomWidth = self.random.randrange(minRoomSize, maxRoomSize, roomStep)
+            roomHeight = self.random.randrange(minRoomSize, maxRoomSize, roomStep)
+            startX = self.random.randint(0, self.width)
+            startY = self.random.randint(0, self.height)
+            if self.quadFits(startX, startY, roomWidth, roomHeight, margin, occupied):
                 for x in range(roomWidth):
                     for y in range(roomHeight):
                         self.grid[startX + x][startY + y] = FLOOR
+                occupied.add_rect(startX, startY, roomWidth, roomHeight)
                 self.rooms.append(dungeonRoom(startX, startY, roomWidth, roomHeight))
 
     def generateCaves(self, p=45, smoothing=4):
         """
         Generates more organic shapes using cellular automata
+        The grid is copied into a numpy array once and every smoothing step updates the whole grid together
 
         Args:
             p: the probability that a cell will become a cave section, values between 30 and 45 work well
@@ -396,23 +426,15 @@ class dungeonGenerator:
             None
         """
 
-        for x in range(self.width):
-            for y in range(self.height):
-                if randint(0, 100) < p:
-                    self.grid[x][y] = CAVE
-        for i in range(smoothing):
-            for x in range(self.width):
-                for y in range(self.height):
-                    if x == 0 or x == self.width or y == 0 or y == self.height:
-                        self.grid[x][y] = EMPTY
-                    touchingEmptySpace = 0
-                    for nx, ny in self.findNeighbours(x, y):
-                        if self.grid[nx][ny] == CAVE:
-                            touchingEmptySpace += 1
-                    if touchingEmptySpace >= 5:
-                        self.grid[x][y] = CAVE
-                    elif touchingEmptySpace <= 2:
-                        self.grid[x][y] = EMPTY
+        # without a seed the noise is seeded from self.random so that random.seed() still reproduces the caves
+        rng = self.npRandom
+        if rng is None:
+            rng = numpy.random.default_rng(self.random.getrandbits(64))
+        grid = numpy.array(self.grid)
+        grid[rng.integers(0, 101, size=grid.shape) < p] = CAVE
+        smooth_caves(grid, CAVE, EMPTY, smoothing)
+        for x, column in enumerate(grid.tolist()):
+            self.grid[x][:] = column
 
     def generateCorridors(self, mode="r", x=None, y=None):
         """
@@ -421,7 +443,7 @@ class dungeonGenerator:
         Populates self.corridors
 
         Args:
-            mode: char, either 'r', 'f', 'm' or 'l'
+            mode: char, either 'r', 'f', 'm' or 'l', or any strategy growingtree.parse_strategy() takes
                   this controls how the next tile to attempt to move to is determined and affects how the generated corridors look
                   'r' - random selection, produces short straigh sections with spine like off-shoots, lots of deadends
                   'f' - first cell in the list to check, long straight secions and few diagnol snaking sections
@@ -434,57 +456,72 @@ class dungeonGenerator:
                 none
         """
 
-        cells = []
+        # the open cells in the order they were added, see growingtree.CellList
+        cells = CellList(mode, self.random.random)
         if not x and not y:
-            x = randint(1, self.width - 2)
-            y = randint(1, self.height - 2)
+            x = self.random.randint(1, self.width - 2)
+            y = self.random.randint(1, self.height - 2)
             while not self.canCarve(x, y, 0, 0):
-                x = randint(1, self.width - 2)
-                y = randint(1, self.height - 2)
+                x = self.random.randint(1, self.width - 2)
+                y = self.random.randint(1, self.height - 2)
         self.grid[x][y] = CORRIDOR
         self.corridors.append((x, y))
-        cells.append((x, y))
-        while cells:
-            if mode == "l":
-                x, y = cells[-1]
-            elif mode == "r":
-                x, y = choice(cells)
-            elif mode == "f":
-                x, y = cells[0]
-            elif mode == "m":
-                x, y = cells[len(cells) // 2]
+        cells.push((x, y))
+        while len(cells):
+            index = cells.select()
+            x, y = cells[index]
             possMoves = self.getPossibleMoves(x, y)
             if possMoves:
-                xi, yi = choice(possMoves)
+                xi, yi = self.random.choice(possMoves)
                 self.grid[xi][yi] = CORRIDOR
                 self.corridors.append((xi, yi))
-                cells.append((xi, yi))
+                cells.push((xi, yi))
             else:
-                cells.remove((x, y))
+                cells.remove(index)
 
-    def pruneDeadends(self, amount):
+    def pruneDeadends(self, amount=None):
         """
         Removes deadends from the corridors/maze
         each iteration will remove all identified dead ends
         it will update self.deadEnds after
+        the number of touching tiles is counted once for every corridor tile and only the neighbours of removed
+        tiles are looked at again, so pruning every dead end takes time linear in the number of corridor tiles
 
         Args:
-            amount: number of iterations to remove dead ends
+            amount: number of iterations to remove dead ends, if None dead ends are removed until none remain
 
         Returns:
             none
         """
-        for i in range(amount):
-            self.findDeadends()
-            for x, y in self.deadends:
+        touching = {}
+        for x, y in self.corridors:
+            if (x, y) not in touching:
+                touching[(x, y)] = sum(1 for nx, ny in self.findNeighboursDirect(x, y) if self.grid[nx][ny])
+        deadends = [cell for cell, count in touching.items() if count == 1]
+        removed = set()
+        iteration = 0
+        while deadends and (amount is None or iteration < amount):
+            for x, y in deadends:
                 self.grid[x][y] = EMPTY
-                self.corridors.remove((x, y))
-        self.findDeadends()
+                removed.add((x, y))
+            nextDeadends = []
+            for x, y in deadends:
+                for cell in self.findNeighboursDirect(x, y):
+                    if cell in touching and cell not in removed:
+                        touching[cell] -= 1
+                        if touching[cell] == 1:
+                            nextDeadends.append(cell)
+            # a tile can drop to 1 and then to 0 in the same iteration, only tiles still at 1 are dead ends
+            deadends = [cell for cell in nextDeadends if touching[cell] == 1]
+            iteration += 1
+        self.corridors = [cell for cell in self.corridors if cell not in removed]
+        self.deadends = [cell for cell in self.corridors if touching[cell] == 1]
 
     def placeWalls(self):
         """
         Places wall tiles around all floor, door and corridor tiles
         As some functions (like floodFill() and anything that uses it) dont distinguish between tile types it is best called later/last
+        The walls are the 8 neighbour dilation of every non empty, non wall tile, applied to empty tiles in one assignment
 
         Args:
             none
@@ -493,13 +530,11 @@ class dungeonGenerator:
             none
         """
 
-        for x in range(self.width):
-            for y in range(self.height):
-                if not self.grid[x][y]:
-                    for nx, ny in self.findNeighbours(x, y):
-                        if self.grid[nx][ny] and self.grid[nx][ny] is not WALL:
-                            self.grid[x][y] = WALL
-                            break
+        grid = numpy.array(self.grid)
+        solid = (grid != EMPTY) & (grid != WALL)
+        grid[dilate(solid) & (grid == EMPTY)] = WALL
+        for x, column in enumerate(grid.tolist()):
+            self.grid[x][:] = column
 
     def connectAllRooms(self, extraDoorChance=0):
         """
@@ -541,13 +576,13 @@ class dungeonGenerator:
                 while chance <= extraDoorChance:
                     pickAgain = True
                     while pickAgain:
-                        x, y = choice(connections)
+                        x, y = self.random.choice(connections)
                         pickAgain = False
                         for xi, yi in self.findNeighbours(x, y):
                             if self.grid[xi][yi] == DOOR:
                                 pickAgain = True
                                 break
-                    chance = randint(0, 100)
+                    chance = self.random.randint(0, 100)
                     self.grid[x][y] = DOOR
                     self.doors.append((x, y))
             else:
@@ -595,7 +630,7 @@ class dungeonGenerator:
         """
         builds the navigation grapth for path finding
         must be called before findPath()
-        Populates self.graph
+        Populates self.navGraph, the graph in CSR form for searches over flat cell ids
 
         Args:
             none
@@ -603,16 +638,31 @@ class dungeonGenerator:
         Returns:
             none
         """
-        for x, y in self.corridors:
-            if self.grid[x][y] < WALL:
-                break
-        for x in range(self.width):
-            for y in range(self.height):
-                if self.grid[x][y] not in [WALL, EMPTY, OBSTACLE]:
-                    self.graph[(x, y)] = []
-                    for nx, ny in self.findNeighboursDirect(x, y):
-                        if self.grid[nx][ny] not in [WALL, EMPTY, OBSTACLE]:
-                            self.graph[(x, y)].append((nx, ny))
+        walkable = ~numpy.isin(numpy.array(self.grid), (WALL, EMPTY, OBSTACLE))
+        self.navGraph = NavGraph(walkable.T)
+        self._graph = None
+
+    @property
+    def graph(self):
+        """
+        the navigation graph as a dictionary of neighbour lists, only built when something still reads it
+
+        Returns:
+            dict with a list of the directly connected floor/corridor tiles of every floor/corridor tile
+        """
+        if self.navGraph is None:
+            return {}
+        if self._graph is None:
+            indptr = self.navGraph.indptr.tolist()
+            indices = self.navGraph.indices
+            # the graph lists neighbours up, down, left, right just like findNeighboursDirect()
+            neighbours = list(zip((indices % self.width).tolist(), (indices // self.width).tolist()))
+            ys, xs = numpy.nonzero(self.navGraph.walkable)
+            self._graph = {}
+            for x, y in zip(xs.tolist(), ys.tolist()):
+                cell = y * self.width + x
+                self._graph[(x, y)] = neighbours[indptr[cell]:indptr[cell + 1]]
+        return self._graph
 
     def findPath(self, startX, startY, endX, endY):
         """
@@ -620,6 +670,7 @@ class dungeonGenerator:
         While not part of generating a dungeon/level it was included as I initially thought that
         since the generator had lots of knowledge about the maze it could use that for fast path finding
         however, the overhead of any heuristic was always greater than time saved. But I kept this as its useful
+        The search runs breadth first over the CSR arrays of self.navGraph
 
         Args:
             startX, startY: integers, grid indicies to find a path from
@@ -628,28 +679,35 @@ class dungeonGenerator:
         Returns:
             a list of grid cells (x,y) leading from the end point to the start point
             such that [(endX, endY) .... (startY, endY)] to support popping of the end as the agent moves
-        """
-
-        cells = []
-        cameFrom = {}
-        cells.append((startX, startY))
-        cameFrom[(startX, startY)] = None
+            None if there is no path
+        """
+        if self.navGraph is None:
+            self.constructNavGraph()
+        if not (0 <= startX < self.width and 0 <= startY < self.height):
+            return None
+        if not (0 <= endX < self.width and 0 <= endY < self.height):
+            return None
+        # memoryviews read the CSR arrays as plain ints without copying them into lists
+        indptr = memoryview(self.navGraph.indptr)
+        indices = memoryview(self.navGraph.indices)
+        start = startY * self.width + startX
+        end = endY * self.width + endX
+        cameFrom = {start: None}
+        cells = deque([start])
         while cells:
-            # manhattan distance sort, commented out at slow, but there should you want it
-            # cells.sort(key=lambda x: abs(endX-x[0]) + abs(endY - x[1]))
-            current = cells[0]
-            del cells[0]
-            if current == (endX, endY):
+            current = cells.popleft()
+            if current == end:
                 break
-            for nx, ny in self.graph[current]:
-                if (nx, ny) not in cameFrom:
-                    cells.append((nx, ny))
-                    cameFrom[(nx, ny)] = current
-        if (endX, endY) in cameFrom:
-            path = []
-            current = (endX, endY)
-            path.append(current)
-            while current != (startX, startY):
-                current = cameFrom[current]
-                path.append(current)
-            return path
+            for position in range(indptr[current], indptr[current + 1]):
+                neighbour = indices[position]
+                if neighbour not in cameFrom:
+                    cells.append(neighbour)
+                    cameFrom[neighbour] = current
+        if end not in cameFrom:
+            return None
+        path = []
+        current = end
+        while current is not None:
+            path.append((current % self.width, current // self.width))
+            current = cameFrom[current]
+        return path
@@ -1,7 +1,10 @@
+import threading
 import time
 
 from kivy.app import App
+from kivy.clock import Clock
 from kivy.graphics.context_instructions import Color
+from kivy.graphics.texture import Texture
 from kivy.graphics.vertex_instructions import Rectangle
 from kivy.properties import ObjectProperty, NumericProperty
 from kivy.uix.boxlayout import BoxLayout
@@ -11,8 +14,9 @@ from kivy.uix.scatterlayout import ScatterLayout
 from kivy.uix.scrollview import ScrollView
 
 from enums import Direction, TileType
-from generator import DungeonGenerator
+from generator import CancellationToken, DungeonGenerator, run_steps
 from point import Point
+from render import rgba_buffer
 
 SCREEN_WIDTH = 1280
 SCREEN_HEIGHT = 720
@@ -23,6 +27,8 @@ TILE_SIZE = 6
 LEVEL_SIZE = 100
 ROOM_MARGIN = 1
 NUM_ROOMS = 100
+# seconds of generation work done per frame, the rest of the frame is left for drawing and input
+FRAME_BUDGET = 1 / 120
 
 COLORS = {
     "WALL": (0.39, 0.8, 0.39, 1),
@@ -71,6 +77,11 @@ class DungeonMap(ScrollView):
             "tile_size": TILE_SIZE,
         }
         self.generator = DungeonGenerator(self.map_settings)
+        self.texture = None
+        self.map_rectangle = None
+        self.steps = None
+        self.step_event = None
+        self.token = None
 
     @property
     def min_room_size(self):
@@ -120,44 +131,92 @@ class DungeonMap(ScrollView):
     def map_height(self, value):
         self.map_settings["map_height"] = value
 
-    def create_dungeon(self):
+    def schedule_steps(self, steps):
         """
-        sets all tiles in dungeon to wall tiles
-        places random rooms with current map settings
+        runs a step-wise generation stage a little every frame, replacing any stage still running
+        :param steps: generator yielding after every small piece of work
         """
-        self.generator.initialize_map()
-        self.generator.place_random_rooms(
-            min_room_size=self.map_settings["min_room_size"],
-            max_room_size=self.map_settings["max_room_size"],
-            margin=self.map_settings["room_margin"],
-        )
+        self.stop_generation()
+        self.steps = steps
+        self.step_event = Clock.schedule_interval(self.advance_steps, 0)
 
-    def build_dungeon(self):
+    def advance_steps(self, dt):
         """
-        sets generator to new instance of Dungeon Generator with current map setting
-        Then creates a dungeon with current map settings
+        Clock callback, runs the current stage for at most FRAME_BUDGET seconds and draws what changed
+        returns False to unschedule itself once the stage is finished
         """
-        self.generator = DungeonGenerator(self.map_settings)
-        self.create_dungeon()
+        deadline = time.perf_counter() + FRAME_BUDGET
+        finished = False
+        try:
+            while time.perf_counter() < deadline:
+                next(self.steps)
+        except StopIteration:
+            finished = True
+        self.display_dungeon()
+        if finished:
+            self.steps = None
+            self.step_event = None
+            return False
+
+    def stop_generation(self):
+        """
+        cancels the background generation and the step-wise stage still running, if any
+        """
+        if self.token is not None:
+            self.token.cancel()
+            self.token = None
+        if self.step_event is not None:
+            self.step_event.cancel()
+            self.step_event = None
+            self.steps = None
+
+    def generate_in_background(self, map_settings: dict, token: CancellationToken):
+        """
+        worker thread, builds a dungeon on its own generator and hands it to the UI thread when done
+        only iter_ stages are run here, so a cancelled request stops within one step instead of finishing its stage,
+        nothing is handed back if token is cancelled first
+        """
+        generator = DungeonGenerator(map_settings)
+        run_steps(generator.iter_create_dungeon(), token)
+        if not token.cancelled:
+            Clock.schedule_once(lambda dt: self.show_generated(generator, token))
+
+    def show_generated(self, generator: DungeonGenerator, token: CancellationToken):
+        """
+        runs on the UI thread, swaps in a finished dungeon unless a newer request replaced it in the meantime
+        """
+        if token is not self.token or token.cancelled:
+            return
+        self.token = None
+        self.clear_dungeon_map()
+        self.generator = generator
+        self.display_dungeon()
 
     def clear_dungeon_map(self):
         """
         clears canvas of Map Label and calls clear_map in self.generator
+        the texture is dropped with the canvas so the next display_dungeon draws the whole map again
         """
         map_label = self.children[0]
         map_label.canvas.before.clear()
         map_label.canvas.clear()
         map_label.canvas.after.clear()
+        self.texture = None
+        self.map_rectangle = None
 
         self.generator.clear_map()
 
     def generate_map(self):
         """
-        clears dungeon map, then builds new dungeon with current map settings and displays map
+        builds a new dungeon with current map settings on a worker thread, the map is replaced once it is done
+        pressing generate again cancels the previous request, only the newest one is ever displayed
         """
-        self.clear_dungeon_map()
-        self.build_dungeon()
-        self.display_dungeon()
+        self.stop_generation()
+        self.token = CancellationToken()
+        worker = threading.Thread(
+            target=self.generate_in_background, args=(dict(self.map_settings), self.token), daemon=True
+        )
+        worker.start()
 
     def update_setting_from_input(self, setting: str, value: int):
         if setting not in self.map_settings.keys() or value < 0:
@@ -185,23 +244,42 @@ class DungeonMap(ScrollView):
 
     def display_dungeon(self):
         """
-        iterates through every tile in the map and draws a rectangle with color based on tile label
+        draws the map as a single texture with one pixel per tile, scaled up by tile_size
+        only the parts of the dungeon changed since the last call are looked up in the palette and uploaded,
+        the whole map is uploaded when the texture has to be created for a new map size
         """
         map_label = self.children[0]
-        for row in range(self.map_height):
-            for col in range(self.map_width):
-                tile = self.generator.tile(col, self.map_height - row - 1)
-
-                r, g, b, a = tile.label()
-                with map_label.canvas:
-                    Color(r, g, b, a)
-                    Rectangle(
-                        pos=(col * self.tile_size - 1, row * self.tile_size - 1),
-                        size=(self.tile_size - 1, self.tile_size - 1),
-                    )
-
-        map_label.width = self.tile_size * self.map_width
-        map_label.height = self.tile_size * self.map_height
+        dungeon = self.generator.dungeon
+        label_grid = dungeon.label_grid
+        height, width = label_grid.shape
+        dirty_rects = dungeon.pop_dirty_rects()
+
+        if self.texture is None or self.texture.size != (width, height):
+            self.texture = Texture.create(size=(width, height), colorfmt="rgba")
+            # nearest filtering keeps every tile a sharp square when scaled up
+            self.texture.mag_filter = "nearest"
+            self.texture.min_filter = "nearest"
+            self.texture.blit_buffer(rgba_buffer(label_grid).tobytes(), colorfmt="rgba", bufferfmt="ubyte")
+            map_label.canvas.clear()
+            with map_label.canvas:
+                Color(1, 1, 1, 1)
+                self.map_rectangle = Rectangle(texture=self.texture, pos=(0, 0))
+        else:
+            for x, y, rect_width, rect_height in dirty_rects:
+                pixels = rgba_buffer(label_grid[y:y + rect_height, x:x + rect_width])
+                # texture rows count up from the bottom of the map
+                self.texture.blit_buffer(
+                    pixels.tobytes(),
+                    pos=(x, height - y - rect_height),
+                    size=(rect_width, rect_height),
+                    colorfmt="rgba",
+                    bufferfmt="ubyte",
+                )
+            map_label.canvas.ask_update()
+
+        self.map_rectangle.size = (width * self.tile_size, height * self.tile_size)
+        map_label.width = self.tile_size * width
+        map_label.height = self.tile_size * height
 
     def test_dungeon(self):
         self.clear_dungeon_map()
@@ -215,15 +293,8 @@ class DungeonMap(ScrollView):
             "tile_size": 10,
         }
         self.generator = DungeonGenerator(map_settings)
-        self.generator.initialize_map()
-        self.generator.place_random_rooms(
-            min_room_size=map_settings["min_room_size"],
-            max_room_size=map_settings["max_room_size"],
-        )
-
         self.map_settings = map_settings
-        self.display_dungeon()
-        time.sleep(1)
+        self.schedule_steps(self.generator.iter_create_dungeon())
         # for y in range(1, self.generator.height, 2):
         #     for x in range(1, self.generator.width, 2):
         #         tile = self.generator.tile(x, y)
@@ -231,8 +302,6 @@ class DungeonMap(ScrollView):
         #             continue
         #         self.generator.grow_maze(Point(x, y))
 
-        self.display_dungeon()
-
     def build_corridors(self):
         # for y in range(1, self.generator.height, 2):
         #     for x in range(1, self.generator.width, 2):
@@ -249,8 +318,7 @@ class DungeonMap(ScrollView):
         #             # time.sleep(1)
         #             continue
         #         self.generator.grow_maze(Point(x, y))
-        self.generator.build_corridors()
-        self.display_dungeon()
+        self.schedule_steps(self.generator.iter_build_corridors())
 
 
 class DungeonGeneratorApp(App):
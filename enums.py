@@ -21,28 +21,31 @@ class Direction(CallableEnum):
     @classmethod
     def cardinal(cls):
         """
-        Yields Point for the cardinal directions (N, E, S, W)
-        :return: generator object of Point for each cardinal directions
+        Returns Point for the cardinal directions (N, E, S, W), the tuple is built once and reused
+        :return: tuple of Point for each cardinal directions
         """
-        for direction in [cls.N, cls.E, cls.S, cls.W]:
-            yield direction.value
+        return CARDINAL_OFFSETS
 
     @classmethod
     def every(cls):
-        for direction in cls:
-            yield direction.value
+        return EVERY_OFFSET
 
     @staticmethod
     def self():
         return Point(0, 0)
 
 
+CARDINAL_OFFSETS = tuple(direction.value for direction in (Direction.N, Direction.E, Direction.S, Direction.W))
+EVERY_OFFSET = tuple(direction.value for direction in Direction)
+
+
 class TileType(CallableEnum):
     WALL = (1, 1, 1, 1)
     FLOOR = (.5, .5, .5, 1)
     DOOR = (1, .5, .5, 1)
     CORRIDOR = (.7, .2, .7, 1)
     EMPTY = (.39, .8, .39, 1)
+    CAVE = (.55, .4, .25, 1)
     BLUE = (0, 0, 1, 1)
     RED = (1, 0, 0, 1)
     YELLOW = (1, 1, 0, 1)
@@ -1,16 +1,199 @@
 import numpy as np
+import threading
 
 from collections import OrderedDict
 from loguru import logger
-from random import randrange, randint, choice
-from typing import List
+from typing import Callable, Generator, List, Tuple
 
-from dungeon import Dungeon
+from cellular import direct_neighbour_count, neighbour_count, smooth_caves
+from dungeon import Dungeon, LABEL_CODES, WALL_CODE
 from enums import Direction, TileType
+from growingtree import CellList, NEWEST, parse_strategy, Strategy
+from instrumentation import Metrics, NULL_METRICS
 from point import Point
+from regions import Component
+from seeding import make_random, seed_sequence
+from storage import save_dungeon
 from tile import Tile
 
 
+# default number of carves, or room attempts, each step-wise stage makes before yielding
+STEP_BUDGET = 256
+
+
+class CancellationToken:
+    """
+    Shared between a caller and a stage running on another thread, the stage stops at its next step once cancelled
+    Only the iter_ stages run by run_steps() have steps, the vectorized stages such as carve_maze() and
+    place_random_rooms_batched() always run to the end, so cancellable work should be built from iter_ stages
+    """
+
+    def __init__(self):
+        self._event = threading.Event()
+
+    def cancel(self):
+        self._event.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+
+def run_steps(steps: Generator, token: CancellationToken = None):
+    """
+    Runs a step-wise stage to the end, or until token is cancelled, which is checked between steps
+    :param steps: generator returned by one of the DungeonGenerator.iter_ methods
+    :type steps: Generator
+    :param token: stops the stage early once cancelled
+    :type token: CancellationToken
+    :return: the value the stage returned, None if it was cancelled
+    """
+    while token is None or not token.cancelled:
+        try:
+            next(steps)
+        except StopIteration as stop:
+            return stop.value
+    steps.close()
+
+
+def carve_offsets(direction: Point) -> tuple:
+    """
+    cells that must be walls for can_carve() to move in direction, relative to the starting cell
+    :param direction: direction to move in, Point(0, 0) checks the 3x3 block around the starting cell
+    :type direction: Point
+    :return: tuple of (x, y) offsets
+    :rtype: tuple
+    """
+    xs = (1, 0, -1) if direction.x == 0 else (1 * direction.x, 2 * direction.x)
+    ys = (1, 0, -1) if direction.y == 0 else (1 * direction.y, 2 * direction.y)
+    return tuple((x, y) for x in xs for y in ys)
+
+
+# offsets for each direction can_carve() is asked about, filled in as new directions are seen
+CARVE_OFFSETS = {}
+
+
+def lattice_mask(label_grid: np.ndarray) -> np.ndarray:
+    """
+    finds the maze lattice cells that can be carved, the tiles with odd x and y whose 3x3 block is all walls
+    :param label_grid: uint8 array of label codes
+    :type label_grid: np.ndarray
+    :return: bool array indexed [ly, lx] for the tile (2 * lx + 1, 2 * ly + 1)
+    :rtype: np.ndarray
+    """
+    height, width = label_grid.shape
+    walls = label_grid == WALL_CODE
+    carvable = walls & (neighbour_count(~walls) == 0)
+    return carvable[1:height - 1:2, 1:width - 1:2][:(height - 1) // 2, :(width - 1) // 2]
+
+
+def grow_tree(
+    available: bytearray,
+    width: int,
+    start: int,
+    rnd: Callable[[], float],
+    strategy: Strategy = NEWEST,
+    winding_percent: int = 100,
+    budget: int = None,
+) -> Generator:
+    """
+    grows a maze over a lattice of cells from start, extending the open cell picked by strategy until none are left
+    cells are flat indices into a lattice padded with a ring of unavailable cells, so neighbours need no bounds check
+    a generator, it yields the cells carved since the last yield, as lists of cells in carving order and of the cell
+    each one was carved from, after every budget cells and once more at the end, start is its own parent
+    :param available: 1 for every cell that may still be carved, carved cells are set to 0
+    :type available: bytearray
+    :param width: width of the padded lattice
+    :type width: int
+    :param start: first cell of the maze
+    :type start: int
+    :param rnd: function returning a float in [0, 1), makes every random choice
+    :param strategy: how the open cell to extend is picked, see parse_strategy()
+    :type strategy: Strategy
+    :param winding_percent: chance, in percent, that a corridor turns when it could carry straight on
+    :type winding_percent: int
+    :param budget: number of cells carved between yields, the whole maze is yielded at once if None
+    :type budget: int
+    :return: number of cells visited and of neighbours found already carved or blocked, as the value of the
+        StopIteration
+    :rtype: Tuple[int, int]
+    """
+    available[start] = 0
+    cells = CellList(strategy, rnd)
+    cells.push(start)
+    # newest is the default and the common case, it works on the end of the newer half without calls to the cell list
+    newest = cells.names == (NEWEST,)
+    stack = cells.high
+    select = cells.select
+    remove = cells.remove
+    push = cells.push
+    carved = [start]
+    parents = [start]
+    options = [0, 0, 0, 0]
+    winding = winding_percent < 100
+    last = start
+    straight = 0
+    visited = 0
+    offered = 0
+    # the newer half is never shorter than the older one, so it is only empty once every cell is dropped
+    while stack:
+        visited += 1
+        if newest:
+            index = -1
+            cell = stack[-1]
+        else:
+            index = select()
+            cell = cells[index]
+        # the four neighbours unrolled, this loop runs twice for every cell of the lattice
+        count = 0
+        neighbour = cell + 1
+        if available[neighbour]:
+            options[0] = neighbour
+            count = 1
+        neighbour = cell - 1
+        if available[neighbour]:
+            options[count] = neighbour
+            count += 1
+        neighbour = cell + width
+        if available[neighbour]:
+            options[count] = neighbour
+            count += 1
+        neighbour = cell - width
+        if available[neighbour]:
+            options[count] = neighbour
+            count += 1
+        if count:
+            offered += count
+            if winding:
+                if cell == last and available[cell + straight] and rnd() * 100 >= winding_percent:
+                    neighbour = cell + straight
+                else:
+                    neighbour = options[int(rnd() * count)]
+                straight = neighbour - cell
+                last = neighbour
+            else:
+                neighbour = options[int(rnd() * count)]
+            available[neighbour] = 0
+            if newest:
+                stack.append(neighbour)
+            else:
+                push(neighbour)
+            # a full batch is handed over before the next cell is added, which also covers start on its own
+            if len(carved) == budget:
+                yield carved, parents
+                carved = []
+                parents = []
+            carved.append(neighbour)
+            parents.append(cell)
+        elif newest:
+            stack.pop()
+        else:
+            remove(index)
+    if carved:
+        yield carved, parents
+    return visited, visited * 4 - offered
+
+
 class Room:
     """
     Args:
@@ -64,7 +247,7 @@ class Room:
 
 
 class DungeonGenerator:
-    def __init__(self, map_settings: dict):
+    def __init__(self, map_settings: dict, metrics: Metrics = None):
         # self.height = abs(map_settings["map_height"])
         # self.width = abs(map_settings["map_width"])
         self.dungeon = Dungeon(map_settings["map_height"], map_settings["map_width"])
@@ -72,18 +255,40 @@ class DungeonGenerator:
         self.current_region: int = -1
 
         self.rooms = []
-        self.corridors = []
         self.regions = OrderedDict({"count": 0})
 
         self.map_settings = OrderedDict(map_settings)
-        self.winding_percent = 20
+        # corridor engine defaults, see parse_strategy() and grow_tree()
+        self.corridor_strategy = map_settings.get("corridor_strategy", NEWEST)
+        self.winding_percent = map_settings.get("winding_percent", 20)
+        parse_strategy(self.corridor_strategy)
+        # every random choice comes from these two streams, seeded from map_settings["seed"] if it is set
+        self.seed_sequence = seed_sequence(map_settings.get("seed"))
+        self.random, self.np_random = make_random(self.seed_sequence)
+
+        # stage timings and counters, recorded only if metrics are passed in or map_settings["instrument"] is set
+        if metrics is None:
+            metrics = Metrics() if map_settings.get("instrument") else NULL_METRICS
+        self.metrics = metrics
 
     def __iter__(self):
         # for j in range(self.height):
         #     for i in range(self.width):
         #         yield i, j, self.grid[i][j]
-        for x, y, tile in self.dungeon.tile_grid:
-            yield x, y, tile
+        for point, tile in self.dungeon:
+            yield point.x, point.y, tile
+
+    def spawn(self, count: int) -> List["DungeonGenerator"]:
+        """
+        Creates generators with the same settings and independent random streams spawned from this one's seed
+        Spawning again gives new children, the n-th child of a seed is always the same
+        :param count: number of generators to create
+        :type count: int
+        :rtype: List[DungeonGenerator]
+        """
+        return [
+            DungeonGenerator(dict(self.map_settings, seed=child)) for child in self.seed_sequence.spawn(count)
+        ]
 
     def new_region(self) -> int:
         self.current_region += 1
@@ -107,22 +312,44 @@ class DungeonGenerator:
         """
 
     def initialize_map(self):
-        for y in self.dungeon.rows:
-            for x in self.dungeon.columns:
-                self.dungeon.set_tile(Point(x, y), TileType.WALL)
+        with self.metrics.stage("initialize_map"):
+            self.dungeon.fill_rect(0, 0, self.dungeon.width, self.dungeon.height, TileType.WALL)
+
+    def create_dungeon(self):
+        """
+        sets all tiles to walls and places random rooms with the room sizes and margin of map_settings
+        """
+        run_steps(self.iter_create_dungeon(None))
+
+    def iter_create_dungeon(self, budget: int = STEP_BUDGET) -> Generator:
+        """
+        create_dungeon() as a generator of small steps, the one list of stages shared by the UI and batch.py
+        :param budget: number of room attempts between yields, see iter_place_random_rooms()
+        :type budget: int
+        """
+        self.initialize_map()
+        yield
+        yield from self.iter_place_random_rooms(
+            min_room_size=self.map_settings["min_room_size"],
+            max_room_size=self.map_settings["max_room_size"],
+            margin=self.map_settings["room_margin"],
+            budget=budget,
+        )
 
     # TODO: refactor self.tile to take Point
-    def tile(self, x: int, y: int) -> Tile:
+    def tile(self, x: int, y: int, shared: bool = False) -> Tile:
         """
 
         :param x: x-coordinate of tile
         :type x: int
         :param y: y-coordinate of tile
         :type y: int
+        :param shared: return the shared Tile for the label instead of building a new one
+        :type shared: bool
         :return: Tile at coordinate (x, y)
         :rtype: Tile
         """
-        tile = self.dungeon.tile(Point(x, y))
+        tile = self.dungeon.tile(Point(x, y), shared)
         return tile
 
     # TODO: replace start_x and start_y with Point variable
@@ -152,11 +379,8 @@ class DungeonGenerator:
         """
         room = Room(start_x, start_y, room_width, room_height)
         if self.room_fits(room, margin) or ignore_overlap:
-            room.region = self.new_region
-            for point in room:
-                # print(point)
-                self.dungeon.set_tile(point, TileType.FLOOR)
-                self.dungeon.set_region(point, self.current_region)
+            room.region = self.new_region()
+            self.dungeon.fill_rect(room.x, room.y, room.width, room.height, TileType.FLOOR, room.region)
             self.rooms.append(room)
 
     def place_random_rooms(
@@ -166,6 +390,7 @@ class DungeonGenerator:
         room_step: int = 1,
         margin: int = 1,
         attempts: int = 500,
+        batch_size: int = None,
     ):
         """
 
@@ -179,16 +404,141 @@ class DungeonGenerator:
         :type margin: int
         :param attempts: number of times 
         :type attempts: int
+        :param batch_size: if set, candidates are drawn and tested with numpy this many at a time
+        :type batch_size: int
+        """
+        with self.metrics.stage("place_random_rooms"):
+            if batch_size is not None:
+                self.place_random_rooms_batched(
+                    min_room_size, max_room_size, room_step, margin, attempts, batch_size
+                )
+                return
+
+            run_steps(self.iter_place_random_rooms(min_room_size, max_room_size, room_step, margin, attempts, None))
+
+    def iter_place_random_rooms(
+        self,
+        min_room_size: int,
+        max_room_size: int,
+        room_step: int = 1,
+        margin: int = 1,
+        attempts: int = 500,
+        budget: int = STEP_BUDGET,
+    ) -> Generator:
+        """
+        place_random_rooms() as a generator that yields after every budget attempts, so a caller can spread the
+        work over several frames, see place_random_rooms() for the other parameters
+        :param budget: number of attempts between yields, never yields if None
+        :type budget: int
         """
-        for _ in range(attempts):
-            if len(self.rooms) >= self.map_settings["num_rooms"]:
-                break
-            room_width = randrange(min_room_size, max_room_size, room_step)
-            room_height = randrange(min_room_size, max_room_size, room_step)
-            start_point = self.random_point()
-            self.place_room(
-                start_point.x, start_point.y, room_width, room_height, margin
+        rooms_before = len(self.rooms)
+        attempted = 0
+        try:
+            for attempt in range(1, attempts + 1):
+                if len(self.rooms) >= self.map_settings["num_rooms"]:
+                    break
+                attempted = attempt
+                room_width = self.random.randrange(min_room_size, max_room_size, room_step)
+                room_height = self.random.randrange(min_room_size, max_room_size, room_step)
+                start_point = self.random_point()
+                self.place_room(
+                    start_point.x, start_point.y, room_width, room_height, margin
+                )
+                if budget is not None and attempt % budget == 0:
+                    yield
+        finally:
+            self.metrics.count("rooms_attempted", attempted)
+            self.metrics.count("rooms_accepted", len(self.rooms) - rooms_before)
+
+    def place_random_rooms_batched(
+        self,
+        min_room_size: int,
+        max_room_size: int,
+        room_step: int = 1,
+        margin: int = 1,
+        attempts: int = 500,
+        batch_size: int = 4096,
+    ):
+        """
+        draws candidate rooms batch_size at a time with numpy instead of one per attempt
+        candidates that are out of bounds or overlap rooms placed before the batch are rejected in array form,
+        survivors are then accepted greedily in the order they were drawn, the same as place_random_rooms would
+        :param min_room_size: minimum number of tiles
+        :type min_room_size: int
+        :param max_room_size: rooms are smaller than this
+        :type max_room_size: int
+        :param room_step: the amount the room size can grow by
+        :type room_step: int
+        :param margin: number of wall tiles kept between rooms
+        :type margin: int
+        :param attempts: total number of candidates drawn
+        :type attempts: int
+        :param batch_size: number of candidates drawn at once
+        :type batch_size: int
+        """
+        sizes = np.arange(min_room_size, max_room_size, room_step)
+        rooms_before = len(self.rooms)
+        remaining = attempts
+        while remaining > 0 and len(self.rooms) < self.map_settings["num_rooms"]:
+            count = min(batch_size, remaining)
+            remaining -= count
+            self.metrics.count("rooms_attempted", count)
+
+            widths = self.np_random.choice(sizes, count)
+            heights = self.np_random.choice(sizes, count)
+            xs = self.np_random.integers(0, self.dungeon.width, size=count, endpoint=True)
+            ys = self.np_random.integers(0, self.dungeon.height, size=count, endpoint=True)
+
+            # same bounds test as room_fits, on the margin rooms of every candidate at once
+            left = xs - margin
+            top = ys - margin
+            margin_widths = widths + margin * 2
+            margin_heights = heights + margin * 2
+            fits = (
+                (left + margin_widths < self.width)
+                & (top + margin_heights < self.height)
+                & (left >= 0)
+                & (top >= 0)
+            )
+            candidates = np.flatnonzero(fits)
+
+            occupied = self.dungeon.occupancy.count_many(
+                left[candidates], top[candidates], margin_widths[candidates], margin_heights[candidates]
             )
+            # candidates can still overlap each other, place_room rechecks each survivor against the updated table
+            for i in candidates[occupied == 0].tolist():
+                if len(self.rooms) >= self.map_settings["num_rooms"]:
+                    break
+                self.place_room(int(xs[i]), int(ys[i]), int(widths[i]), int(heights[i]), margin)
+        self.metrics.count("rooms_accepted", len(self.rooms) - rooms_before)
+
+    def generate_caves(self, p: int = 45, smoothing: int = 4):
+        """
+        grows organic caves out of the walls with cellular automata, the whole grid is updated at once each step
+        only wall and cave tiles are changed so rooms and corridors carved before are kept
+        :param p: the probability that a wall becomes a cave section, values between 30 and 45 work well
+        :type p: int
+        :param smoothing: number of smoothing steps, little effect past 4
+        :type smoothing: int
+        """
+        with self.metrics.stage("generate_caves"):
+            run_steps(self.iter_generate_caves(p, smoothing))
+
+    def iter_generate_caves(self, p: int = 45, smoothing: int = 4) -> Generator:
+        """
+        generate_caves() as a generator, the noise and then every smoothing step is written to the dungeon and
+        followed by a yield so the caves can be watched settling
+        """
+        cave = LABEL_CODES[TileType.CAVE]
+        grid = self.dungeon.label_grid.copy()
+        editable = (grid == WALL_CODE) | (grid == cave)
+        grid[editable & (self.np_random.integers(0, 101, size=grid.shape) < p)] = cave
+        for step in range(smoothing + 1):
+            if step:
+                smooth_caves(grid, cave, WALL_CODE, 1, editable)
+            self.dungeon.set_tiles(editable & (grid == cave), TileType.CAVE)
+            self.dungeon.set_tiles(editable & (grid == WALL_CODE), TileType.WALL)
+            yield
 
     def room_fits(self, room: Room, margin: int) -> bool:
         """
@@ -200,75 +550,27 @@ class DungeonGenerator:
         :return: 
         :rtype: bool
         """
-        mar_room = Room(
-            (room.x - margin),
-            (room.y - margin),
-            (room.width + margin * 2),
-            (room.height + margin * 2),
-        )
-
-        if (
-            mar_room.x + mar_room.width < self.width
-            and mar_room.y + mar_room.height < self.height
-            and mar_room.x >= 0
-            and mar_room.y >= 0
-        ):
-            for x, y in mar_room:
-                tile = self.tile(x, y)
-                if tile.label is not TileType.WALL:
-                    return False
-
-            return True
+        x = room.x - margin
+        y = room.y - margin
+        width = room.width + margin * 2
+        height = room.height + margin * 2
+
+        if x + width < self.width and y + height < self.height and x >= 0 and y >= 0:
+            # every tile in the margin room has to be a wall, counted in O(1) from the dungeon's occupancy table
+            return self.dungeon.occupied_count(x, y, width, height) == 0
         return False
 
-    def grow_maze(self, start: Point, label: TileType = None):
+    def grow_maze(self, start: Point, label: TileType = None) -> int:
         """
-
-        :param start:
+        grows one maze on the lattice of odd tiles from start, see carve_maze()
+        :param start: tile to start from, nothing is carved if its lattice cell is not free
         :type start: Point
-        :param label:
+        :param label: tile type to carve, TileType.CORRIDOR if None
         :type label: TileType
+        :return: number of tiles carved
+        :rtype: int
         """
-
-        if label is None:
-            label = TileType.CORRIDOR
-        tiles = []
-        last_direction = Point(0, 0)
-
-        region = self.new_region()
-        self.carve(start, region, label)
-
-        tiles.append(start)
-        while len(tiles) > 0:
-            tile = tiles.pop(-1)  # grab last tile
-
-            # see which neighboring tiles can be carved
-            open_tiles = []
-            for d in Direction.cardinal():
-                if self.can_carve(tile, d):
-                    # print("True")
-                    open_tiles.append(d)
-                # else:
-                # print("False")
-
-            if len(open_tiles) > 0:
-
-                if (
-                    last_direction in open_tiles
-                    and randint(1, 101) > self.winding_percent
-                ):
-                    current_direction = last_direction
-                else:
-                    current_direction = open_tiles[randint(0, len(open_tiles) - 1)]
-
-                self.carve(tile + current_direction, region, label)
-                self.carve(tile + current_direction * 2, region, label)
-
-                open_tiles.append(tile + current_direction * 2)
-                last_direction = current_direction
-            else:
-                # end current path
-                last_direction = None
+        return self.carve_maze(start, label=label, fill=False)
 
     def find_neighbors(self, point: Point, neighbors: Direction = None):
         """
@@ -298,6 +600,51 @@ class DungeonGenerator:
         """
         return self.find_neighbors(point, neighbors=Direction.cardinal())
 
+    def find_unconnected_areas(self) -> List[Component]:
+        """
+        gives every group of connected walkable tiles its own region, overwriting the regions of rooms and corridors
+        :return: a Component with the region, size and bounding box of every group
+        :rtype: List[Component]
+        """
+        with self.metrics.stage("find_unconnected_areas"):
+            components = self.dungeon.label_regions(first_region=self.current_region + 1)
+        self.current_region += len(components)
+        self.metrics.count("unconnected_areas", len(components))
+        return components
+
+    def save(self, path: str):
+        """
+        Writes the dungeon with its rooms and corridors to a binary dungeon file, see storage.load_dungeon()
+        :param path: file to write
+        :type path: str
+        """
+        save_dungeon(path, self.dungeon, self.rooms, corridors=self.corridor_tiles())
+
+    def corridor_tiles(self) -> np.ndarray:
+        """
+        :return: int array of the (x, y) of every tile labelled CORRIDOR, row by row
+        :rtype: np.ndarray
+        """
+        ys, xs = np.nonzero(self.dungeon.label_grid == LABEL_CODES[TileType.CORRIDOR])
+        return np.stack((xs, ys), axis=1)
+
+    def corridor_points(self) -> List[Point]:
+        """
+        scans the label grid for every tile labelled CORRIDOR, whichever stage carved it, nothing keeps a list of
+        corridor Points up to date while carving, call corridor_tiles() when an array will do
+        :rtype: List[Point]
+        """
+        return [Point(x, y) for x, y in self.corridor_tiles().tolist()]
+
+    @property
+    def corridors(self) -> List[Point]:
+        """
+        read only, every corridor tile as a Point, a new list from corridor_points() on each access so it always
+        matches the label grid, change corridors through the dungeon instead of this list
+        :rtype: List[Point]
+        """
+        return self.corridor_points()
+
     def clear_map(self):
         """
         Clears map by setting rooms to an empty list and calling dungeon.clear_dungeon()
@@ -312,14 +659,19 @@ class DungeonGenerator:
             logger.error("pos in can_carve() sent as None")
             return False
 
-        xs = (1, 0, -1) if direction.x == 0 else (1 * direction.x, 2 * direction.x)
-        ys = (1, 0, -1) if direction.y == 0 else (1 * direction.y, 2 * direction.y)
-
-        for x in xs:
-            for y in ys:
-                tile = self.tile(pos.x + x, pos.y + y)
-                if tile.label != TileType.WALL:
-                    return False
+        offsets = CARVE_OFFSETS.get((direction.x, direction.y))
+        if offsets is None:
+            offsets = CARVE_OFFSETS[direction.x, direction.y] = carve_offsets(direction)
+
+        # read the label grid directly, anything outside the dungeon counts as not a wall
+        labels = self.dungeon.label_grid
+        width = self.dungeon.width
+        height = self.dungeon.height
+        for x, y in offsets:
+            x += pos.x
+            y += pos.y
+            if not (0 <= x < width and 0 <= y < height) or labels[y, x] != WALL_CODE:
+                return False
         return True
 
     def carve(self, pos: Point, region: int, label: TileType = None):
@@ -329,50 +681,209 @@ class DungeonGenerator:
         self.dungeon.set_tile(pos, label)
         self.dungeon.set_region(pos, region)
 
-    def build_corridors(self, start_point: Point = None):
-        cells = []
-        if start_point is None:
-            start_point = Point(
-                x=randint(1, self.width - 2), y=randint(1, self.height - 2)
-            )
-            # TODO: refactor can_carve
-        attempts = 0
-        while not self.can_carve(start_point, Direction.self()):
-            attempts += 1
-            start_point = Point(
-                x=randint(1, self.width - 2), y=randint(1, self.height - 2)
-            )
-            # TODO: need to remove this hard stop once everything is combined
-            if attempts > 100:
-                break
-
-        self.carve(pos=start_point, region=self.new_region(), label=TileType.CORRIDOR)
-        # add point to corridor list
-        self.corridors.append(start_point)
-        # add point to open cell list
-        cells.append(start_point)
-        # logger.debug(f"first start_point added to cells: {cells}")
-        attempts = 0
-        while cells:
-            start_point = cells[-1]
-            possible_moves = self.possible_moves(start_point)
-            if possible_moves:
-                # logger.debug(f"possible_moves is {len(possible_moves)} long")
-                point = choice(possible_moves)
-                # logger.debug(f"chosen point is {point}")
-                self.carve(
-                    pos=point, region=self.current_region, label=TileType.CORRIDOR
-                )
-                self.corridors.append(point)
-                cells.append(point)
-            else:
-                cells.remove(start_point)
-            # logger.debug(f"cells is {len(cells)} long")
-            # logger.debug(f"{cells}")
-            # attempts += 1
-            # if attempts > 15:
-            #     logger.add("debug.log")
-            #     break
+    def carve_maze(
+        self,
+        start_point: Point = None,
+        strategy: Strategy = None,
+        winding_percent: int = None,
+        label: TileType = None,
+        fill: bool = True,
+    ) -> int:
+        """
+        fills every wall area of the map with corridors on the lattice of odd tiles, working on flat indices
+        the first maze starts at the lattice cell nearest start_point, or the first free one if None, then a new
+        maze, with its own region, is started from every lattice cell still free until none are left
+        :param start_point: tile to start the first maze from
+        :type start_point: Point
+        :param strategy: how the next cell to extend is picked, self.corridor_strategy if None
+        :type strategy: Strategy
+        :param winding_percent: chance a corridor turns when it could go straight, self.winding_percent if None
+        :type winding_percent: int
+        :param label: tile type to carve, TileType.CORRIDOR if None
+        :type label: TileType
+        :param fill: only the first maze is grown if False
+        :type fill: bool
+        :return: number of tiles carved
+        :rtype: int
+        """
+        with self.metrics.stage("carve_maze"):
+            return run_steps(self.iter_carve_maze(start_point, strategy, winding_percent, label, fill, None))
+
+    def iter_carve_maze(
+        self,
+        start_point: Point = None,
+        strategy: Strategy = None,
+        winding_percent: int = None,
+        label: TileType = None,
+        fill: bool = True,
+        budget: int = STEP_BUDGET,
+    ) -> Generator:
+        """
+        carve_maze() as a generator, each maze is grown a step at a time and the tiles of a step are written as soon
+        as they are carved, yielding after every budget tiles so the corridors can be watched growing
+        :param budget: number of tiles carved between yields, each maze is carved in one step if None
+        :type budget: int
+        :return: number of tiles carved, as the value of the StopIteration
+        :rtype: int
+        """
+        if strategy is None:
+            strategy = self.corridor_strategy
+        if winding_percent is None:
+            winding_percent = self.winding_percent
+        if label is None:
+            label = TileType.CORRIDOR
+        lattice = lattice_mask(self.dungeon.label_grid)
+        lattice_height, lattice_width = lattice.shape
+        width = lattice_width + 2
+        padded = np.zeros((lattice_height + 2, width), dtype=np.uint8)
+        padded[1:-1, 1:-1] = lattice
+        available = bytearray(padded.tobytes())
+
+        start = available.find(1)
+        if start_point is not None:
+            lx = min(max((start_point.x - 1) // 2, 0), lattice_width - 1)
+            ly = min(max((start_point.y - 1) // 2, 0), lattice_height - 1)
+            if available[(ly + 1) * width + lx + 1]:
+                start = (ly + 1) * width + lx + 1
+            elif not fill:
+                return 0
+
+        # every carved cell is written together with the passage from its parent, the first cell of a maze twice
+        cell_budget = None if budget is None else max(budget // 2, 1)
+        carved_tiles = 0
+        visited = 0
+        rejected = 0
+        try:
+            while start != -1:
+                region = self.new_region()
+                maze = grow_tree(available, width, start, self.random.random, strategy, winding_percent, cell_budget)
+                while True:
+                    try:
+                        cells, parents = next(maze)
+                    except StopIteration as stop:
+                        maze_visited, maze_rejected = stop.value
+                        break
+                    carved_tiles += self.write_passages(cells, parents, width, label, region)
+                    yield
+                visited += maze_visited
+                rejected += maze_rejected
+                # the first cell of the maze is its own parent, it was counted twice
+                carved_tiles -= 1
+                start = available.find(1) if fill else -1
+        finally:
+            self.metrics.count("carve_calls", carved_tiles)
+            self.metrics.count("cells_visited", visited)
+            self.metrics.count("can_carve_rejections", rejected)
+        return carved_tiles
+
+    def write_passages(self, cells: List[int], parents: List[int], width: int, label: TileType, region: int) -> int:
+        """
+        writes lattice cells carved by grow_tree() and the tile between each one and its parent to the dungeon
+        :param cells: flat indices of the carved cells in the padded lattice
+        :type cells: List[int]
+        :param parents: the cell each one was carved from
+        :type parents: List[int]
+        :param width: width of the padded lattice
+        :type width: int
+        :return: number of tiles written, two per cell
+        :rtype: int
+        """
+        # lattice cell (lx, ly) is tile (2 * lx + 1, 2 * ly + 1), the padding shifts both by one cell
+        ly, lx = np.divmod(np.array(cells), width)
+        parent_y, parent_x = np.divmod(np.array(parents), width)
+        xs = np.stack((lx + parent_x - 1, lx * 2 - 1), axis=1).ravel()
+        ys = np.stack((ly + parent_y - 1, ly * 2 - 1), axis=1).ravel()
+        self.dungeon.set_cells(xs, ys, label, region)
+        return len(xs)
+
+    def build_corridors(self, start_point: Point = None, strategy: Strategy = None, winding_percent: int = None):
+        """
+        fills the walls between the rooms with mazes, see carve_maze()
+        """
+        with self.metrics.stage("build_corridors"):
+            run_steps(self.iter_carve_maze(start_point, strategy, winding_percent, budget=None))
+
+    def iter_build_corridors(
+        self,
+        start_point: Point = None,
+        budget: int = STEP_BUDGET,
+        strategy: Strategy = None,
+        winding_percent: int = None,
+    ) -> Generator:
+        """
+        build_corridors() as a generator that yields after every budget tiles, see iter_carve_maze()
+        """
+        return (yield from self.iter_carve_maze(start_point, strategy, winding_percent, budget=budget))
+
+    def prune_dead_ends(self, amount: int = None) -> int:
+        with self.metrics.stage("prune_dead_ends"):
+            removed = run_steps(self.iter_prune_dead_ends(amount, None))
+        self.metrics.count("dead_ends_removed", removed)
+        return removed
+
+    def iter_prune_dead_ends(self, amount: int = None, budget: int = STEP_BUDGET) -> Generator:
+        """
+        turns corridor tiles touching only one walkable tile back into walls
+        each iteration removes every current dead end, touching counts are computed once for the whole map
+        and afterwards only the neighbours of removed tiles are looked at, so the work is linear in corridor tiles
+        :param amount: number of iterations, dead ends are removed until none remain if None
+        :type amount: int
+        :param budget: the tiles removed so far are written to the dungeon and the generator yields once at least
+            this many are waiting, never yields if None
+        :type budget: int
+        :return: number of corridor tiles removed, as the value of the StopIteration
+        :rtype: int
+        """
+        width = self.dungeon.width + 2
+        # a border of walls around the map removes every bounds check from the flat indices
+        walkable = np.zeros((self.dungeon.height + 2, width), dtype=bool)
+        walkable[1:-1, 1:-1] = self.dungeon.walkable_mask()
+        corridor = np.zeros(walkable.shape, dtype=bool)
+        corridor[1:-1, 1:-1] = self.dungeon.label_grid == LABEL_CODES[TileType.CORRIDOR]
+        counts = direct_neighbour_count(walkable)
+        touching = bytearray(counts.ravel())
+        is_open = bytearray(walkable.ravel())
+        is_corridor = bytearray(corridor.ravel())
+
+        offsets = (1, -1, width, -width)
+        dead_ends = np.flatnonzero(corridor & walkable & (counts == 1)).tolist()
+        removed = []
+        written = 0
+        iteration = 0
+        while dead_ends and (amount is None or iteration < amount):
+            if budget is not None and len(removed) - written >= budget:
+                self.remove_corridors(removed[written:], width)
+                written = len(removed)
+                yield
+            for index in dead_ends:
+                is_open[index] = 0
+            removed.extend(dead_ends)
+            next_dead_ends = []
+            for index in dead_ends:
+                for offset in offsets:
+                    neighbor = index + offset
+                    if is_open[neighbor]:
+                        touching[neighbor] -= 1
+                        if touching[neighbor] == 1 and is_corridor[neighbor]:
+                            next_dead_ends.append(neighbor)
+            dead_ends = [index for index in next_dead_ends if touching[index] == 1]
+            iteration += 1
+
+        self.remove_corridors(removed[written:], width)
+        return len(removed)
+
+    def remove_corridors(self, indices: List[int], width: int):
+        """
+        turns corridor tiles back into walls, only the tiles themselves are written, used by iter_prune_dead_ends()
+        :param indices: flat indices of the tiles in the map padded by one tile on every side
+        :type indices: List[int]
+        :param width: width of the padded map
+        :type width: int
+        """
+        if not indices:
+            return
+        ys, xs = np.divmod(np.array(indices), width)
+        self.dungeon.set_cells(xs - 1, ys - 1, TileType.WALL, region=-1)
 
     def possible_moves(self, pos: Point) -> List[Point]:
         """
@@ -383,22 +894,16 @@ class DungeonGenerator:
         :return: list of potential points the path could move
         :rtype: List[Point]
         """
-        # logger.debug(f"inside possible_moves {pos}")
         available_squares = []
+        width = self.dungeon.width
+        height = self.dungeon.height
         for direction in Direction.cardinal():
-            # logger.debug(f"direction = {direction}")
-            neighbor = pos + direction
-            # logger.debug(f"neighbor = {neighbor}")
-            if not self.dungeon.in_bounds(neighbor):
-                # logger.debug(f"{neighbor} not in bounds")
+            x = pos.x + direction.x
+            y = pos.y + direction.y
+            if not (0 <= x < width and 0 <= y < height):
                 continue
             if self.can_carve(pos, direction):
-                # logger.debug(f"can_carve returned True pos={pos}, direction={direction}")
-                available_squares.append(neighbor)
-        # logger.debug(f"available squares:")
-        # for square in available_squares:
-        # logger.debug(f"square={square}")
-        # logger.add("debug.log")
+                available_squares.append(Point(x, y))
         return available_squares
 
     @property
@@ -411,5 +916,5 @@ class DungeonGenerator:
 
     def random_point(self) -> Point:
         return Point(
-            x=randint(0, self.dungeon.width), y=randint(0, self.dungeon.height)
+            x=self.random.randint(0, self.dungeon.width), y=self.random.randint(0, self.dungeon.height)
         )
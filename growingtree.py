@@ -0,0 +1,140 @@
+"""
+Cell selection for growing tree mazes
+
+A growing tree keeps a list of open cells and repeatedly extends one of them, the strategy that picks it decides
+what the maze looks like. CellList picks and drops the newest, oldest and middle cell in O(1) and keeps the cells
+in age order. It is shared by generator.DungeonGenerator and the legacy dungeonGenerator and has no dependencies of
+its own.
+"""
+from bisect import bisect
+from collections import deque
+from itertools import accumulate
+from typing import Callable, Mapping, Tuple, Union
+
+# how a growing tree picks the open cell to extend next
+NEWEST = "newest"
+RANDOM = "random"
+OLDEST = "oldest"
+MIDDLE = "middle"
+STRATEGIES = (NEWEST, RANDOM, OLDEST, MIDDLE)
+# the mode letters of dungeonGenerator.generateCorridors()
+LEGACY_MODES = {"l": NEWEST, "r": RANDOM, "f": OLDEST, "m": MIDDLE}
+
+Strategy = Union[str, Mapping[str, float]]
+
+
+def parse_strategy(strategy: Strategy) -> Tuple[Tuple[str, ...], Tuple[float, ...]]:
+    """
+    :param strategy: a name from STRATEGIES or LEGACY_MODES, or a mapping of names to weights to mix several,
+        {"newest": 3, "random": 1} extends the newest cell three times out of four
+    :type strategy: Strategy
+    :return: the strategy names and their cumulative weights, scaled so the last one is 1
+    :rtype: Tuple[Tuple[str, ...], Tuple[float, ...]]
+    :raises ValueError: for an unknown name or weights that are negative or add up to 0
+    """
+    if isinstance(strategy, str):
+        strategy = {strategy: 1}
+    names = tuple(LEGACY_MODES.get(name, name) for name in strategy)
+    for name in names:
+        if name not in STRATEGIES:
+            raise ValueError(f"unknown corridor strategy {name!r}, expected one of {', '.join(STRATEGIES)}")
+    weights = tuple(strategy.values())
+    total = sum(weights)
+    if total <= 0 or min(weights) < 0:
+        raise ValueError(f"corridor strategy weights must be positive, got {dict(zip(names, weights))}")
+    return names, tuple(accumulate(weight / total for weight in weights))
+
+
+class CellList:
+    """
+    The open cells of a growing tree in the order they were added, select() picks one by the strategy and remove()
+    drops it
+
+    The cells are split at the median into two deques, the older half in low and the newer half in high, and
+    indices count from the oldest cell. The newest, oldest and middle cells sit at the ends of the deques, so
+    picking and dropping them is O(1) and the list stays in age order for any mix of strategies. The halves are
+    only kept balanced when middle is one of the strategies. A random pick inside a mix is dropped with del on its
+    deque, which costs the distance to the nearer end. With random alone the order is never read, high is then a
+    plain list and a removed cell is overwritten by the newest one, which is O(1).
+
+    Attributes:
+        low: deque of the older half of the cells, oldest first
+        high: deque of the newer half, newest last, a list when the strategy is random alone
+    """
+
+    __slots__ = ("low", "high", "ordered", "balanced", "names", "cumulative", "selectors", "rnd", "select")
+
+    def __init__(self, strategy: Strategy = NEWEST, rnd: Callable[[], float] = None):
+        """
+        :param strategy: see parse_strategy()
+        :type strategy: Strategy
+        :param rnd: function returning a float in [0, 1), for the random strategy and picking between a mix
+        """
+        self.names, self.cumulative = parse_strategy(strategy)
+        self.rnd = rnd
+        self.ordered = self.names != (RANDOM,)
+        self.balanced = MIDDLE in self.names
+        self.low = deque()
+        self.high = deque() if self.ordered else []
+        self.selectors = tuple(getattr(self, f"select_{name}") for name in self.names)
+        self.select = self.select_mixed if len(self.names) > 1 else self.selectors[0]
+
+    def __len__(self) -> int:
+        return len(self.low) + len(self.high)
+
+    def __getitem__(self, index: int):
+        low = len(self.low)
+        return self.low[index] if index < low else self.high[index - low]
+
+    def push(self, cell):
+        self.high.append(cell)
+        if self.balanced and len(self.high) > len(self.low) + 1:
+            self.low.append(self.high.popleft())
+
+    def select_newest(self) -> int:
+        return len(self) - 1
+
+    def select_oldest(self) -> int:
+        return 0
+
+    def select_middle(self) -> int:
+        return len(self.low)
+
+    def select_random(self) -> int:
+        return int(self.rnd() * len(self))
+
+    def select_mixed(self) -> int:
+        return self.selectors[min(bisect(self.cumulative, self.rnd()), len(self.selectors) - 1)]()
+
+    def remove(self, index: int):
+        """
+        :param index: index returned by select()
+        :type index: int
+        """
+        low, high = self.low, self.high
+        if not self.ordered:
+            newest = high.pop()
+            if index < len(high):
+                high[index] = newest
+            return
+        split = len(low)
+        if index >= split:
+            index -= split
+            if index == len(high) - 1:
+                high.pop()
+            elif index == 0:
+                high.popleft()
+            else:
+                del high[index]
+        elif index == 0:
+            low.popleft()
+        elif index == split - 1:
+            low.pop()
+        else:
+            del low[index]
+        if self.balanced:
+            # middle is high[0], the halves stay equal or high holds one more
+            if len(high) > len(low) + 1:
+                low.append(high.popleft())
+            elif len(low) > len(high):
+                high.appendleft(low.pop())
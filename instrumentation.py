@@ -0,0 +1,116 @@
+"""
+Per stage timings and counters for DungeonGenerator
+
+Generators hold NULL_METRICS unless instrumentation is asked for, every call on it does nothing. Stages add up their
+counters locally and record them once when they finish, so an uninstrumented generator pays close to nothing.
+"""
+import time
+
+from collections import OrderedDict
+from loguru import logger
+
+
+class StageTimer:
+    __slots__ = ("metrics", "name", "started")
+
+    def __init__(self, metrics: "Metrics", name: str):
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.metrics.add_time(self.name, time.perf_counter() - self.started)
+        return False
+
+
+class NullStage:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+NULL_STAGE = NullStage()
+
+
+class Metrics:
+    """
+    Collects how long each stage took and how often things happened
+
+    Attributes:
+        stages: OrderedDict of stage name to [total seconds, number of runs]
+        counters: OrderedDict of counter name to count
+    """
+
+    enabled = True
+
+    def __init__(self):
+        self.stages = OrderedDict()
+        self.counters = OrderedDict()
+
+    def stage(self, name: str) -> StageTimer:
+        """
+        :return: context manager adding the time spent inside it to stage name
+        :rtype: StageTimer
+        """
+        return StageTimer(self, name)
+
+    def add_time(self, name: str, seconds: float):
+        totals = self.stages.setdefault(name, [0.0, 0])
+        totals[0] += seconds
+        totals[1] += 1
+
+    def count(self, name: str, amount: int = 1):
+        self.counters[name] = self.counters.get(name, 0) + amount
+
+    def report(self) -> dict:
+        """
+        :return: {"stages": {name: {"seconds", "runs"}}, "counters": {name: count}}
+        :rtype: dict
+        """
+        return {
+            "stages": {name: {"seconds": seconds, "runs": runs} for name, (seconds, runs) in self.stages.items()},
+            "counters": dict(self.counters),
+        }
+
+    def log(self, level: str = "INFO"):
+        """
+        Sends the report to loguru, one line per stage and one for the counters
+        """
+        for name, (seconds, runs) in self.stages.items():
+            logger.log(level, f"{name}: {seconds * 1000:.2f}ms over {runs} run(s)")
+        if self.counters:
+            logger.log(level, ", ".join(f"{name}={count}" for name, count in self.counters.items()))
+
+    def reset(self):
+        self.stages.clear()
+        self.counters.clear()
+
+
+class NullMetrics(Metrics):
+    """
+    Metrics that record nothing, shared by every uninstrumented generator
+    """
+
+    enabled = False
+
+    def stage(self, name: str) -> NullStage:
+        return NULL_STAGE
+
+    def add_time(self, name: str, seconds: float):
+        pass
+
+    def count(self, name: str, amount: int = 1):
+        pass
+
+    def log(self, level: str = "INFO"):
+        pass
+
+
+NULL_METRICS = NullMetrics()
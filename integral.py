@@ -0,0 +1,123 @@
+import numpy
+
+
+class SummedAreaTable:
+    """
+    An integral image over a 2D boolean mask, counts how many cells are set inside any rectangle in O(1)
+
+    The table is one row and one column larger than the mask so that table[y, x] holds the number of set cells
+    above and to the left of (x, y), which removes every edge case from count()
+    Rectangles added with add_rect() are kept in a short pending list and folded into the table in one pass once
+    the list is full, so placing many small rooms on a large map does not rewrite the table every time
+
+    Args:
+        mask: 2D array indexed [y, x], truthy cells are counted
+        max_pending: number of rectangles kept before they are folded into the table
+
+    Attributes:
+        height, width: shape of the mask the table was built from
+        table: int64 array of shape (height + 1, width + 1)
+        pending: list of (x, y, right, bottom, value) rectangles not yet folded into table
+    """
+
+    def __init__(self, mask: numpy.ndarray, max_pending: int = 128):
+        self.height, self.width = mask.shape
+        self.table = numpy.zeros((self.height + 1, self.width + 1), dtype=numpy.int64)
+        self.max_pending = max_pending
+        self.pending = []
+        self.rebuild(mask)
+
+    def rebuild(self, mask: numpy.ndarray):
+        """
+        Recomputes the whole table from mask in O(width * height) and drops any pending rectangles
+        :param mask: 2D array with the same shape the table was created with
+        :type mask: numpy.ndarray
+        """
+        numpy.cumsum(mask, axis=0, out=self.table[1:, 1:])
+        numpy.cumsum(self.table[1:, 1:], axis=1, out=self.table[1:, 1:])
+        self.pending = []
+
+    def count(self, x: int, y: int, width: int, height: int) -> int:
+        """
+        Counts the set cells inside a rectangle, the rectangle must be within the mask
+        :param x: left column of the rectangle
+        :type x: int
+        :param y: top row of the rectangle
+        :type y: int
+        :param width: number of columns the rectangle spans
+        :type width: int
+        :param height: number of rows the rectangle spans
+        :type height: int
+        :return: number of set cells
+        :rtype: int
+        """
+        table = self.table
+        right = x + width
+        bottom = y + height
+        total = int(table[bottom, right] - table[y, right] - table[bottom, x] + table[y, x])
+        for p_x, p_y, p_right, p_bottom, value in self.pending:
+            if p_x < right and x < p_right and p_y < bottom and y < p_bottom:
+                overlap_x = min(right, p_right) - max(x, p_x)
+                overlap_y = min(bottom, p_bottom) - max(y, p_y)
+                total += value * overlap_x * overlap_y
+        return total
+
+    def count_many(self, xs: numpy.ndarray, ys: numpy.ndarray, widths: numpy.ndarray, heights: numpy.ndarray) -> numpy.ndarray:
+        """
+        Vectorized count() for many rectangles at once, every rectangle must be within the mask
+        :param xs: left columns of the rectangles
+        :type xs: numpy.ndarray
+        :param ys: top rows of the rectangles
+        :type ys: numpy.ndarray
+        :param widths: number of columns each rectangle spans
+        :type widths: numpy.ndarray
+        :param heights: number of rows each rectangle spans
+        :type heights: numpy.ndarray
+        :return: number of set cells in each rectangle
+        :rtype: numpy.ndarray
+        """
+        table = self.table
+        rights = xs + widths
+        bottoms = ys + heights
+        totals = table[bottoms, rights] - table[ys, rights] - table[bottoms, xs] + table[ys, xs]
+        if self.pending:
+            p_x, p_y, p_right, p_bottom, values = numpy.array(self.pending).T
+            overlap_x = numpy.minimum(rights[:, None], p_right) - numpy.maximum(xs[:, None], p_x)
+            overlap_y = numpy.minimum(bottoms[:, None], p_bottom) - numpy.maximum(ys[:, None], p_y)
+            totals += (values * overlap_x.clip(min=0) * overlap_y.clip(min=0)).sum(axis=1)
+        return totals
+
+    def add_rect(self, x: int, y: int, width: int, height: int, value: int = 1):
+        """
+        Records that every cell in a rectangle changed by value, without rescanning the mask
+        :param x: left column of the rectangle
+        :type x: int
+        :param y: top row of the rectangle
+        :type y: int
+        :param width: number of columns the rectangle spans
+        :type width: int
+        :param height: number of rows the rectangle spans
+        :type height: int
+        :param value: amount each cell changed by, 1 when cells became set, -1 when they were cleared
+        :type value: int
+        """
+        self.pending.append((x, y, x + width, y + height, value))
+        if len(self.pending) > self.max_pending:
+            self.flush()
+
+    def flush(self):
+        """
+        Folds every pending rectangle into the table in one pass over the part of the table below and to the
+        right of the pending rectangles
+        """
+        if not self.pending:
+            return
+        top = min(rect[1] for rect in self.pending)
+        left = min(rect[0] for rect in self.pending)
+        delta = numpy.zeros((self.height - top, self.width - left), dtype=self.table.dtype)
+        for x, y, right, bottom, value in self.pending:
+            delta[y - top:bottom - top, x - left:right - left] += value
+        numpy.cumsum(delta, axis=0, out=delta)
+        numpy.cumsum(delta, axis=1, out=delta)
+        self.table[top + 1:, left + 1:] += delta
+        self.pending = []
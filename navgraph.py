@@ -0,0 +1,153 @@
+import numpy
+
+# neighbour order of every row in the graph: up (y - 1), down (y + 1), left (x - 1), right (x + 1)
+DIRECTIONS = ((0, -1), (0, 1), (-1, 0), (1, 0))
+
+
+class NavGraph:
+    """
+    A navigation graph in compressed sparse row form over the flat cell ids of a grid, cell (x, y) has id y * width + x
+
+    The neighbours of cell i are indices[indptr[i]:indptr[i + 1]], only walkable cells have neighbours.
+    Which of its 4 neighbours each cell connects to is kept as a bit mask, changing tiles only recomputes the bits
+    around them. The CSR arrays are not patched, they are dropped on any change and rebuilt from the bits in one
+    vectorized pass the next time they are read, so a graph read after every edit costs a full build each time.
+    DistanceField and the legacy DungeonGenerator.findPath search the CSR arrays, A* in pathfinding.py keeps its own
+    padded byte grid, which is faster for its cell by cell expansion
+
+    Args:
+        walkable: 2D boolean array indexed [y, x]
+
+    Attributes:
+        height, width: size of the grid
+        walkable: copy of the walkable mask the graph was built from
+        links: uint8 array over the cells, bit d is set when the cell connects in DIRECTIONS[d]
+    """
+
+    def __init__(self, walkable: numpy.ndarray):
+        self.height, self.width = walkable.shape
+        self.walkable = numpy.array(walkable, dtype=bool)
+        self.links = numpy.zeros(self.height * self.width, dtype=numpy.uint8)
+        self._indptr = None
+        self._indices = None
+        self.update_links(0, 0, self.width, self.height)
+
+    @classmethod
+    def from_dungeon(cls, dungeon) -> "NavGraph":
+        return cls(dungeon.walkable_mask())
+
+    def update_links(self, x: int, y: int, width: int, height: int):
+        """
+        Recomputes the links of every cell in a rectangle from the walkable mask
+        """
+        right = min(x + width, self.width)
+        bottom = min(y + height, self.height)
+        x = max(x, 0)
+        y = max(y, 0)
+        if x >= right or y >= bottom:
+            return
+        # the rectangle plus a one cell border of its neighbours, padded with False outside the grid
+        padded = numpy.zeros((bottom - y + 2, right - x + 2), dtype=bool)
+        top, left = max(y - 1, 0), max(x - 1, 0)
+        window = self.walkable[top:min(bottom + 1, self.height), left:min(right + 1, self.width)]
+        padded[top - y + 1:top - y + 1 + window.shape[0], left - x + 1:left - x + 1 + window.shape[1]] = window
+        area = padded[1:-1, 1:-1]
+        links = numpy.zeros(area.shape, dtype=numpy.uint8)
+        for bit, (dx, dy) in enumerate(DIRECTIONS):
+            neighbours = padded[1 + dy:padded.shape[0] - 1 + dy, 1 + dx:padded.shape[1] - 1 + dx]
+            links |= (area & neighbours).astype(numpy.uint8) << bit
+        self.links.reshape(self.height, self.width)[y:bottom, x:right] = links
+        self._indptr = None
+
+    def update(self, x: int, y: int, walkable: numpy.ndarray):
+        """
+        Changes the walkable mask inside a rectangle and recomputes the links around it
+        :param x: left column of the rectangle
+        :type x: int
+        :param y: top row of the rectangle
+        :type y: int
+        :param walkable: 2D boolean array with the new mask of the rectangle
+        :type walkable: numpy.ndarray
+        """
+        height, width = walkable.shape
+        self.walkable[y:y + height, x:x + width] = walkable
+        # cells just outside the rectangle link into it, so their bits change as well
+        self.update_links(x - 1, y - 1, width + 2, height + 2)
+
+    def update_cells(self, xs: numpy.ndarray, ys: numpy.ndarray, walkable):
+        """
+        Changes the walkable mask of scattered cells and recomputes the links of them and their neighbours only
+        :param xs: columns of the cells
+        :type xs: numpy.ndarray
+        :param ys: rows of the cells, the same length as xs
+        :type ys: numpy.ndarray
+        :param walkable: new walkable value of every cell, or one value for all of them
+        """
+        xs = numpy.asarray(xs)
+        ys = numpy.asarray(ys)
+        if not len(xs):
+            return
+        self.walkable[ys, xs] = walkable
+        # the cells and their 4 neighbours, clipped to the grid
+        around_x = numpy.concatenate([xs] + [xs + dx for dx, _ in DIRECTIONS])
+        around_y = numpy.concatenate([ys] + [ys + dy for _, dy in DIRECTIONS])
+        inside = (around_x >= 0) & (around_x < self.width) & (around_y >= 0) & (around_y < self.height)
+        cells = numpy.unique(around_y[inside] * self.width + around_x[inside])
+        cell_y, cell_x = numpy.divmod(cells, self.width)
+        walkable = self.walkable[cell_y, cell_x]
+        links = numpy.zeros(len(cells), dtype=numpy.uint8)
+        for bit, (dx, dy) in enumerate(DIRECTIONS):
+            x = cell_x + dx
+            y = cell_y + dy
+            linked = walkable & (x >= 0) & (x < self.width) & (y >= 0) & (y < self.height)
+            linked[linked] = self.walkable[y[linked], x[linked]]
+            links |= linked.astype(numpy.uint8) << bit
+        self.links[cells] = links
+        self._indptr = None
+
+    def build(self):
+        """
+        Builds indptr and indices from the links of every cell
+        """
+        cells = numpy.arange(self.height * self.width)
+        offsets = numpy.array([dy * self.width + dx for dx, dy in DIRECTIONS])
+        linked = (self.links[:, None] >> numpy.arange(len(DIRECTIONS), dtype=numpy.uint8)) & 1
+        self._indices = (cells[:, None] + offsets)[linked.astype(bool)]
+        self._indptr = numpy.zeros(len(cells) + 1, dtype=numpy.int64)
+        numpy.cumsum(linked.sum(axis=1), out=self._indptr[1:])
+
+    @property
+    def indptr(self) -> numpy.ndarray:
+        if self._indptr is None:
+            self.build()
+        return self._indptr
+
+    @property
+    def indices(self) -> numpy.ndarray:
+        if self._indptr is None:
+            self.build()
+        return self._indices
+
+    def neighbours(self, cell: int) -> numpy.ndarray:
+        """
+        :param cell: id of the cell, y * width + x
+        :type cell: int
+        :return: ids of the walkable cells cell connects to, in DIRECTIONS order
+        :rtype: numpy.ndarray
+        """
+        indptr = self.indptr
+        return self.indices[indptr[cell]:indptr[cell + 1]]
+
+    def degree(self) -> numpy.ndarray:
+        """
+        :return: number of neighbours of every cell
+        :rtype: numpy.ndarray
+        """
+        return numpy.diff(self.indptr)
+
+    def cell(self, x: int, y: int) -> int:
+        return y * self.width + x
+
+    def position(self, cell: int) -> tuple:
+        y, x = divmod(int(cell), self.width)
+        return x, y
@@ -0,0 +1,553 @@
+from collections import OrderedDict, deque
+from heapq import heappop, heappush
+from typing import List, Optional
+
+import numpy
+
+from point import Point
+
+
+class PathFinder:
+    """
+    A* over the flattened cells of a Dungeon
+
+    The walkable tiles are copied once into a flat byte string with a border of unwalkable cells, so neighbours are
+    index offsets and need no bounds checks. Cost, parent, visit and closed stamp lists are allocated once and
+    reused, a query only touches the cells it reaches. Everything is rebuilt when the dungeon's version changes
+
+    Args:
+        dungeon to search
+
+    Attributes:
+        dungeon: the Dungeon being searched
+        width: width of the padded grid, cell (x, y) has index (y + 1) * width + x + 1
+        walkable: bytes, non zero for every walkable cell of the padded grid
+        version: dungeon.version the arrays were built from
+    """
+
+    def __init__(self, dungeon):
+        self.dungeon = dungeon
+        self.width = dungeon.width + 2
+        self.version = None
+        self.walkable = b""
+        self.cost = []
+        self.parent = []
+        self.stamp = []
+        self.closed = []
+        self.rows = []
+        self.columns = []
+        self.shift = 0
+        self.search = 0
+
+    def refresh(self):
+        """
+        Rebuilds the walkable cells if the dungeon changed since the last query
+        """
+        if self.version == self.dungeon.version:
+            return
+        padded = numpy.zeros((self.dungeon.height + 2, self.width), dtype=numpy.uint8)
+        padded[1:-1, 1:-1] = self.dungeon.walkable_mask()
+        self.walkable = padded.tobytes()
+        size = len(self.walkable)
+        if len(self.cost) != size:
+            self.cost = [0] * size
+            self.parent = [0] * size
+            self.stamp = [0] * size
+            self.closed = [0] * size
+            self.rows = [index // self.width for index in range(size)]
+            self.columns = [index % self.width for index in range(size)]
+            self.shift = size.bit_length()
+        self.version = self.dungeon.version
+
+    def index(self, point: Point) -> int:
+        return (point.y + 1) * self.width + point.x + 1
+
+    def point(self, index: int) -> Point:
+        y, x = divmod(index, self.width)
+        return Point(x - 1, y - 1)
+
+    def is_walkable(self, point: Point) -> bool:
+        """
+        :return: True if point is on the map and walkable, as of the last refresh()
+        :rtype: bool
+        """
+        return self.dungeon.in_bounds(point) and bool(self.walkable[self.index(point)])
+
+    def find_path(self, start: Point, goal: Point) -> Optional[List[Point]]:
+        """
+        finds a shortest path between two walkable tiles moving up, down, left and right
+        uses a binary heap frontier ordered by cost so far plus manhattan distance to the goal
+
+        :param start: tile to search from
+        :type start: Point
+        :param goal: tile to search to
+        :type goal: Point
+        :return: the path from goal back to start, both included, so the next step can be popped off the end,
+            or None if goal cannot be reached
+        :rtype: List[Point]
+        """
+        self.refresh()
+        if not (self.dungeon.in_bounds(start) and self.dungeon.in_bounds(goal)):
+            return None
+        walkable = self.walkable
+        source = self.index(start)
+        target = self.index(goal)
+        if not (walkable[source] and walkable[target]):
+            return None
+
+        width = self.width
+        cost = self.cost
+        parent = self.parent
+        stamp = self.stamp
+        closed = self.closed
+        self.search += 1
+        search = self.search
+        offsets = (1, -1, width, -width)
+        # manhattan distance split into a row part and a column part, looked up instead of computed per push
+        goal_row, goal_column = divmod(target, width)
+        row_distance = [abs(row - goal_row) for row in range(len(walkable) // width)]
+        column_distance = [abs(column - goal_column) for column in range(width)]
+        rows = self.rows
+        columns = self.columns
+        # heap entries are plain ints ordered by estimated total cost, then by larger cost so far, then by index
+        shift = self.shift
+        index_mask = (1 << shift) - 1
+        longest = len(walkable)
+
+        cost[source] = 0
+        parent[source] = -1
+        stamp[source] = search
+        frontier = [source]
+        while frontier:
+            current = heappop(frontier) & index_mask
+            if closed[current] == search:
+                continue
+            if current == target:
+                break
+            closed[current] = search
+            next_cost = cost[current] + 1
+            for offset in offsets:
+                neighbor = current + offset
+                if not walkable[neighbor]:
+                    continue
+                if stamp[neighbor] == search and cost[neighbor] <= next_cost:
+                    continue
+                stamp[neighbor] = search
+                cost[neighbor] = next_cost
+                parent[neighbor] = current
+                estimate = next_cost + row_distance[rows[neighbor]] + column_distance[columns[neighbor]]
+                heappush(frontier, ((estimate * longest + longest - next_cost) << shift) | neighbor)
+        else:
+            return None
+
+        path = []
+        current = target
+        while current != -1:
+            path.append(self.point(current))
+            current = parent[current]
+        return path
+
+
+# frontiers smaller than this are expanded cell by cell, the numpy overhead is not worth it on a few cells
+SMALL_FRONTIER = 48
+
+
+def bfs_distances(indptr: numpy.ndarray, indices: numpy.ndarray, source: int) -> numpy.ndarray:
+    """
+    breadth first search from one cell of a NavGraph, one whole level of the frontier at a time
+    large levels gather their neighbours from the CSR arrays with numpy, small ones (as in winding corridors) with a
+    plain loop
+
+    :param indptr: row pointers of the graph, the neighbours of cell i are indices[indptr[i]:indptr[i + 1]]
+    :type indptr: numpy.ndarray
+    :param indices: neighbour ids of the graph
+    :type indices: numpy.ndarray
+    :param source: id of the cell to search from
+    :type source: int
+    :return: int32 array with the number of steps from source to every cell, -1 where it cannot be reached
+    :rtype: numpy.ndarray
+    """
+    distances = numpy.full(len(indptr) - 1, -1, dtype=numpy.int32)
+    distances[source] = 0
+    # memoryviews index the arrays as plain ints without converting them to lists
+    rows = memoryview(indptr)
+    neighbours = memoryview(indices)
+    frontier = [source]
+    level = 0
+    while len(frontier):
+        level += 1
+        if len(frontier) < SMALL_FRONTIER:
+            cells = frontier.tolist() if isinstance(frontier, numpy.ndarray) else frontier
+            frontier = []
+            for cell in cells:
+                for position in range(rows[cell], rows[cell + 1]):
+                    neighbor = neighbours[position]
+                    if distances[neighbor] < 0:
+                        distances[neighbor] = level
+                        frontier.append(neighbor)
+        else:
+            frontier = numpy.asarray(frontier)
+            starts = indptr[frontier]
+            counts = indptr[frontier + 1] - starts
+            # position of every neighbour in indices, each row's run laid out one after another
+            positions = numpy.arange(counts.sum()) + numpy.repeat(starts - (numpy.cumsum(counts) - counts), counts)
+            reached = indices[positions]
+            reached = numpy.unique(reached[distances[reached] < 0])
+            distances[reached] = level
+            frontier = reached
+    return distances
+
+
+class DistanceField:
+    """
+    Distances from every tile to one target and the next step towards it, a flow field shared by every agent
+    heading to the same target. The distances come from a search over the dungeon's NavGraph and are laid out on
+    the path finder's padded grid
+
+    Args:
+        path finder whose padded grid the field is built on
+        target tile
+
+    Attributes:
+        target: the Point every step leads to
+        version: dungeon.version the field was built from
+        width: width of the padded grid
+        distances: int32 array over the padded grid, steps to target or -1 if it cannot be reached
+        flow: int array over the padded grid, index of the next cell towards target or -1
+    """
+
+    def __init__(self, finder: PathFinder, target: Point):
+        """
+        :raises ValueError: if target is off the map or not walkable
+        """
+        finder.refresh()
+        if not finder.is_walkable(target):
+            raise ValueError(f"distance field target {target} is off the map or not walkable")
+        self.target = target
+        self.version = finder.version
+        self.width = finder.width
+        self.finder = finder
+        graph = finder.dungeon.nav_graph
+        distances = bfs_distances(graph.indptr, graph.indices, graph.cell(target.x, target.y))
+        self.distances = numpy.full(len(finder.walkable), -1, dtype=numpy.int32)
+        self.distances.reshape(-1, self.width)[1:-1, 1:-1] = distances.reshape(graph.height, graph.width)
+
+        # every reachable cell points at a neighbour one step closer, found for all cells at once
+        offsets = numpy.array((1, -1, self.width, -self.width))
+        cells = numpy.flatnonzero(self.distances > 0)
+        neighbors = cells[:, None] + offsets
+        neighbor_distances = self.distances[neighbors].astype(numpy.int64)
+        neighbor_distances[neighbor_distances < 0] = len(self.distances)
+        closest = numpy.argmin(neighbor_distances, axis=1)
+        self.flow = numpy.full(len(self.distances), -1, dtype=numpy.int64)
+        self.flow[cells] = neighbors[numpy.arange(len(cells)), closest]
+
+    def distance(self, point: Point) -> int:
+        """
+        :return: number of steps from point to target, -1 if target cannot be reached
+        :rtype: int
+        """
+        if not self.finder.dungeon.in_bounds(point):
+            return -1
+        return int(self.distances[self.finder.index(point)])
+
+    def next_step(self, point: Point) -> Optional[Point]:
+        """
+        looks up the tile to move to from point in O(1)
+        :return: the neighbour of point one step closer to target, None at the target or if it cannot be reached
+        :rtype: Point
+        """
+        if not self.finder.dungeon.in_bounds(point):
+            return None
+        step = int(self.flow[self.finder.index(point)])
+        if step < 0:
+            return None
+        return self.finder.point(step)
+
+    def path(self, point: Point) -> Optional[List[Point]]:
+        """
+        follows the flow field from point to target
+        :return: the path from target back to point, both included, the same order as PathFinder.find_path,
+            or None if target cannot be reached
+        :rtype: List[Point]
+        """
+        if self.distance(point) < 0:
+            return None
+        index = self.finder.index(point)
+        path = [self.finder.point(index)]
+        flow = self.flow
+        while True:
+            index = int(flow[index])
+            if index < 0:
+                break
+            path.append(self.finder.point(index))
+        path.reverse()
+        return path
+
+
+class FlowFieldCache:
+    """
+    Least recently used cache of DistanceFields keyed by target and dungeon version
+    Fields built before the dungeon last changed are never returned and are dropped on the next miss
+
+    Args:
+        path finder the fields are built on
+        maximum number of fields kept
+
+    Attributes:
+        finder: the PathFinder shared by every field
+        max_fields: maximum number of fields kept
+        fields: OrderedDict of (target index, version) to DistanceField, least recently used first
+    """
+
+    def __init__(self, finder: PathFinder, max_fields: int = 16):
+        self.finder = finder
+        self.max_fields = max_fields
+        self.fields = OrderedDict()
+
+    def field(self, target: Point) -> Optional[DistanceField]:
+        """
+        :param target: tile every agent is heading to
+        :type target: Point
+        :return: the cached field for target, built if the dungeon changed or it was never asked for,
+            None if target is off the map or not walkable
+        :rtype: DistanceField
+        """
+        self.finder.refresh()
+        if not self.finder.is_walkable(target):
+            return None
+        version = self.finder.dungeon.version
+        key = (self.finder.index(target), version)
+        field = self.fields.get(key)
+        if field is not None:
+            self.fields.move_to_end(key)
+            return field
+
+        for stale in [key for key in self.fields if key[1] != version]:
+            del self.fields[stale]
+        field = DistanceField(self.finder, target)
+        self.fields[key] = field
+        if len(self.fields) > self.max_fields:
+            self.fields.popitem(last=False)
+        return field
+
+
+class HierarchicalPlanner:
+    """
+    HPA* style planner over the regions of a Dungeon
+
+    Walkable tiles are grouped into clusters, tiles of one region inside one cluster_size square block.
+    Where two clusters touch, the middle pair of tiles of every touching stretch becomes an entrance,
+    the tiles of an entrance are the nodes of a small abstract graph. Distances between the nodes of a cluster are
+    found with a search limited to that cluster the first time they are needed and cached until the dungeon changes.
+    Long queries search the abstract graph first and only search tile by tile inside the clusters the route uses
+
+    Paths are not always the shortest, but stay close to it
+
+    Args:
+        dungeon to plan on
+        cluster_size: width and height of the blocks regions are split into
+
+    Attributes:
+        dungeon: the Dungeon being planned on
+        finder: PathFinder whose padded grid the planner shares
+        cluster_size: width and height of the blocks regions are split into
+        clusters: list over the padded grid, cluster number of every walkable tile or -1
+        cluster_nodes: dict of cluster number to the node indices inside it
+        entrances: dict of node index to the nodes of other clusters it touches
+        intra: dict of node index to its list of (node, distance) edges, filled as needed
+        version: dungeon.version the graph was built from
+    """
+
+    def __init__(self, dungeon, cluster_size: int = 32):
+        self.dungeon = dungeon
+        self.finder = dungeon.path_finder
+        self.cluster_size = cluster_size
+        self.clusters = []
+        self.cluster_nodes = {}
+        self.entrances = {}
+        self.intra = {}
+        self.version = None
+
+    def refresh(self):
+        """
+        Rebuilds the clusters and the abstract graph if the dungeon changed since the last query
+        """
+        if self.version == self.dungeon.version:
+            return
+        self.finder.refresh()
+        dungeon = self.dungeon
+        width = self.finder.width
+        size = self.cluster_size
+
+        walkable = dungeon.walkable_mask()
+        rows, columns = numpy.indices(dungeon.grid_shape)
+        blocks_across = -(-dungeon.width // size)
+        blocks = (rows // size) * blocks_across + columns // size
+        block_count = blocks_across * -(-dungeon.height // size)
+        keys = (dungeon.region_grid.astype(numpy.int64) + 1) * block_count + blocks
+        padded = numpy.full((dungeon.height + 2, width), -1, dtype=numpy.int64)
+        padded[1:-1, 1:-1][walkable] = numpy.unique(keys[walkable], return_inverse=True)[1]
+        clusters = padded.ravel()
+
+        self.clusters = clusters.tolist()
+        self.cluster_nodes = {}
+        self.entrances = {}
+        self.intra = {}
+        # offset 1 pairs a tile with the one to its right, stretches of them run down the columns, and the reverse
+        for offset, step in ((1, width), (width, 1)):
+            first = clusters[:-offset]
+            second = clusters[offset:]
+            cells = numpy.flatnonzero((first >= 0) & (second >= 0) & (first != second))
+            pairs = numpy.stack((clusters[cells], clusters[cells + offset], cells), axis=1)
+            pairs = pairs[numpy.lexsort((cells, pairs[:, 1], pairs[:, 0]))].tolist()
+            stretch = []
+            for cluster, other, cell in pairs:
+                if stretch and (stretch[-1][0], stretch[-1][1], stretch[-1][2] + step) != (cluster, other, cell):
+                    self.add_entrance(stretch[len(stretch) // 2][2], offset)
+                    stretch = []
+                stretch.append((cluster, other, cell))
+            if stretch:
+                self.add_entrance(stretch[len(stretch) // 2][2], offset)
+        self.version = dungeon.version
+
+    def add_entrance(self, cell: int, offset: int):
+        neighbor = cell + offset
+        for node, other in ((cell, neighbor), (neighbor, cell)):
+            self.entrances.setdefault(node, []).append(other)
+            self.cluster_nodes.setdefault(self.clusters[node], set()).add(node)
+
+    def search_cluster(self, source: int, target: int = None):
+        """
+        breadth first search that never leaves the cluster of source
+
+        :param source: index to search from
+        :type source: int
+        :param target: index to stop at, the whole cluster is searched if None
+        :type target: int
+        :return: dict of index to distance and dict of index to the index it was reached from
+        :rtype: tuple
+        """
+        clusters = self.clusters
+        cluster = clusters[source]
+        width = self.finder.width
+        offsets = (1, -1, width, -width)
+        distances = {source: 0}
+        parents = {source: -1}
+        queue = deque([source])
+        while queue:
+            current = queue.popleft()
+            if current == target:
+                break
+            next_distance = distances[current] + 1
+            for offset in offsets:
+                neighbor = current + offset
+                if clusters[neighbor] == cluster and neighbor not in distances:
+                    distances[neighbor] = next_distance
+                    parents[neighbor] = current
+                    queue.append(neighbor)
+        return distances, parents
+
+    def node_edges(self, node: int) -> list:
+        """
+        :return: (node, distance) for the other nodes of the cluster node can reach and for the nodes its entrances
+            lead to, cached after the first call
+        :rtype: list
+        """
+        edges = self.intra.get(node)
+        if edges is None:
+            reached = self.search_cluster(node)[0]
+            edges = [
+                (other, reached[other])
+                for other in self.cluster_nodes[self.clusters[node]]
+                if other != node and other in reached
+            ]
+            edges.extend((other, 1) for other in self.entrances[node])
+            self.intra[node] = edges
+        return edges
+
+    def find_path(self, start: Point, goal: Point) -> Optional[List[Point]]:
+        """
+        finds a path between two walkable tiles, searching the abstract graph first and then the clusters it uses
+
+        :param start: tile to search from
+        :type start: Point
+        :param goal: tile to search to
+        :type goal: Point
+        :return: the path from goal back to start, both included, the same order as PathFinder.find_path,
+            or None if goal cannot be reached
+        :rtype: List[Point]
+        """
+        self.refresh()
+        if not (self.dungeon.in_bounds(start) and self.dungeon.in_bounds(goal)):
+            return None
+        finder = self.finder
+        source = finder.index(start)
+        target = finder.index(goal)
+        if self.clusters[source] < 0 or self.clusters[target] < 0:
+            return None
+
+        # connect start and goal to the nodes of their own clusters for this query only
+        from_start = self.search_cluster(source)[0]
+        start_edges = {
+            node: from_start[node]
+            for node in self.cluster_nodes.get(self.clusters[source], ())
+            if node in from_start
+        }
+        if target in from_start:
+            start_edges[target] = from_start[target]
+        to_goal = self.search_cluster(target)[0]
+        goal_edges = {
+            node: to_goal[node]
+            for node in self.cluster_nodes.get(self.clusters[target], ())
+            if node in to_goal
+        }
+
+        width = finder.width
+        goal_row, goal_column = divmod(target, width)
+
+        def estimate(index: int) -> int:
+            row, column = divmod(index, width)
+            return abs(row - goal_row) + abs(column - goal_column)
+
+        costs = {source: 0}
+        came_from = {source: None}
+        frontier = [(estimate(source), 0, source)]
+        while frontier:
+            _, cost, current = heappop(frontier)
+            if current == target:
+                break
+            if cost > costs[current]:
+                continue
+            if current == source:
+                edges = list(start_edges.items())
+                edges.extend((neighbor, 1) for neighbor in self.entrances.get(source, ()))
+            else:
+                edges = self.node_edges(current)
+                if current in goal_edges:
+                    edges = edges + [(target, goal_edges[current])]
+            for neighbor, distance in edges:
+                next_cost = cost + distance
+                if next_cost < costs.get(neighbor, next_cost + 1):
+                    costs[neighbor] = next_cost
+                    came_from[neighbor] = current
+                    heappush(frontier, (next_cost + estimate(neighbor), next_cost, neighbor))
+        else:
+            return None
+
+        waypoints = [target]
+        while came_from[waypoints[-1]] is not None:
+            waypoints.append(came_from[waypoints[-1]])
+
+        # refine every stretch of the route that stays inside a cluster, entrances are single steps
+        path = [target]
+        for end, begin in zip(waypoints, waypoints[1:]):
+            if self.clusters[end] != self.clusters[begin]:
+                path.append(begin)
+                continue
+            parents = self.search_cluster(begin, end)[1]
+            current = parents[end]
+            while current != -1:
+                path.append(current)
+                current = parents[current]
+        return [finder.point(index) for index in path]
@@ -11,6 +11,9 @@ class Point:
         x: x-coordinate of the point
         y: y-coordinate of the point
     """
+
+    __slots__ = ("x", "y")
+
     def __init__(self, x: int, y: int):
         self.x = x
         self.y = y
@@ -22,13 +25,18 @@ class Point:
         return Point(self.x - other.x, self.y - other.y)
 
     def __eq__(self, other):
+        # the class check is the fast path, isinstance() keeps subclasses comparable
+        if other.__class__ is not Point and not isinstance(other, Point):
+            return NotImplemented
         return self.x == other.x and self.y == other.y
 
     def __ne__(self, other):
-        return self.x != other.x and self.y != other.y
+        if other.__class__ is not Point and not isinstance(other, Point):
+            return NotImplemented
+        return self.x != other.x or self.y != other.y
 
     def __hash__(self):
-        return self.x ^ self.y
+        return hash((self.x, self.y))
 
     def __mul__(self, other: int):
         return Point(self.x * other, self.y * other)
@@ -0,0 +1,163 @@
+from typing import List, Tuple
+
+import numpy
+
+
+class Component:
+    """
+    A group of connected cells found by label_components()
+
+    Args:
+        region number and size of the component
+        x- and y-coordinate of the top left corner of its bounding box
+        width and height of its bounding box
+
+    Attributes:
+        region: label written into the label grid for every cell of the component
+        size: number of cells in the component
+        x, y: top left corner of the bounding box
+        width, height: size of the bounding box
+    """
+
+    def __init__(self, region: int, size: int, x: int, y: int, width: int, height: int):
+        self.region = region
+        self.size = size
+        self.x = x
+        self.y = y
+        self.width = width
+        self.height = height
+
+    def __repr__(self):
+        return (
+            f"({self.__class__.__name__}) region={self.region}, size={self.size}, "
+            f"x={self.x}, y={self.y}, width={self.width}, height={self.height}"
+        )
+
+
+def find_runs(mask: numpy.ndarray) -> Tuple[numpy.ndarray, numpy.ndarray, numpy.ndarray]:
+    """
+    finds every horizontal run of set cells in a 2D mask
+
+    :param mask: 2D boolean array indexed [row, column]
+    :type mask: numpy.ndarray
+    :return: row, first column and one past the last column of every run, ordered by row then column
+    :rtype: Tuple[numpy.ndarray, numpy.ndarray, numpy.ndarray]
+    """
+    height, width = mask.shape
+    # a cleared column on both sides stops runs from wrapping onto the next row
+    padded = numpy.zeros((height, width + 2), dtype=numpy.int8)
+    padded[:, 1:-1] = mask
+    edges = numpy.diff(padded.ravel())
+    starts = numpy.flatnonzero(edges == 1)
+    ends = numpy.flatnonzero(edges == -1)
+    rows = starts // (width + 2)
+    return rows, starts - rows * (width + 2), ends - rows * (width + 2)
+
+
+def join_runs(rows, starts, ends, diagonal: bool = False) -> Tuple[numpy.ndarray, numpy.ndarray]:
+    """
+    finds every pair of runs on neighbouring rows that touch
+
+    :return: index of the upper and lower run of every touching pair
+    :rtype: Tuple[numpy.ndarray, numpy.ndarray]
+    """
+    reach = 1 if diagonal else 0
+    # runs never share a row position, so sorting by (row, column) also sorts the flattened starts and ends
+    width = int(ends.max()) + 2 if len(ends) else 1
+    flat_starts = rows * width + starts
+    flat_ends = rows * width + ends
+    # the same span of columns moved up one row
+    above_starts = flat_starts - width - reach
+    above_ends = flat_ends - width + reach
+    first = numpy.searchsorted(flat_ends, above_starts, side="right")
+    last = numpy.searchsorted(flat_starts, above_ends, side="left")
+    counts = numpy.maximum(last - first, 0)
+
+    lower = numpy.repeat(numpy.arange(len(rows)), counts)
+    offsets = numpy.arange(counts.sum()) - numpy.repeat(numpy.cumsum(counts) - counts, counts)
+    upper = numpy.repeat(first, counts) + offsets
+    keep = rows[upper] == rows[lower] - 1
+    return upper[keep], lower[keep]
+
+
+def merge_runs(count: int, upper: numpy.ndarray, lower: numpy.ndarray) -> numpy.ndarray:
+    """
+    union-find over runs with every pair hooked at once, roots always point at the smallest run in the set
+
+    :return: index of the root run for every run
+    :rtype: numpy.ndarray
+    """
+    parent = numpy.arange(count)
+    while len(upper):
+        root_upper = parent[upper]
+        root_lower = parent[lower]
+        joined = root_upper != root_lower
+        if not joined.any():
+            break
+        upper = upper[joined]
+        lower = lower[joined]
+        root_upper = root_upper[joined]
+        root_lower = root_lower[joined]
+        numpy.minimum.at(parent, numpy.maximum(root_upper, root_lower), numpy.minimum(root_upper, root_lower))
+        # compress every path so that each run points straight at its root
+        while True:
+            grandparent = parent[parent]
+            if numpy.array_equal(grandparent, parent):
+                break
+            parent = grandparent
+    return parent
+
+
+def label_components(
+    mask: numpy.ndarray, out: numpy.ndarray = None, first_label: int = 0, diagonal: bool = False
+) -> List[Component]:
+    """
+    labels connected groups of set cells in a 2D mask, in time linear in the number of horizontal runs
+    runs are found for the whole mask at once, touching runs on neighbouring rows are merged with union-find
+    and every run is then painted into out, no per cell lists are built
+
+    :param mask: 2D boolean array indexed [row, column]
+    :type mask: numpy.ndarray
+    :param out: integer array the same shape as mask, set cells are overwritten with their component's label
+        and other cells are left alone, a new array filled with -1 is used if None
+    :type out: numpy.ndarray
+    :param first_label: label of the first component, the rest are numbered from it in scan order
+    :type first_label: int
+    :param diagonal: if True cells touching only at a corner are connected as well
+    :type diagonal: bool
+    :return: a Component for every connected group, ordered by label
+    :rtype: List[Component]
+    """
+    if out is None:
+        out = numpy.full(mask.shape, -1, dtype=numpy.int32)
+    rows, starts, ends = find_runs(mask)
+    if not len(rows):
+        return []
+
+    upper, lower = join_runs(rows, starts, ends, diagonal)
+    roots = merge_runs(len(rows), upper, lower)
+    # roots are the first run of each component, so the order of unique() is scan order
+    _, run_labels = numpy.unique(roots, return_inverse=True)
+    count = int(run_labels.max()) + 1
+
+    height, width = mask.shape
+    painted = numpy.zeros(height * (width + 1) + 1, dtype=numpy.int64)
+    numpy.add.at(painted, rows * (width + 1) + starts, run_labels + 1)
+    numpy.add.at(painted, rows * (width + 1) + ends, -(run_labels + 1))
+    painted = numpy.cumsum(painted[:-1]).reshape(height, width + 1)[:, :width]
+    out[mask] = painted[mask] - 1 + first_label
+
+    sizes = numpy.bincount(run_labels, weights=ends - starts, minlength=count)
+    left = numpy.full(count, width)
+    right = numpy.zeros(count, dtype=numpy.int64)
+    top = numpy.full(count, height)
+    bottom = numpy.zeros(count, dtype=numpy.int64)
+    numpy.minimum.at(left, run_labels, starts)
+    numpy.maximum.at(right, run_labels, ends)
+    numpy.minimum.at(top, run_labels, rows)
+    numpy.maximum.at(bottom, run_labels, rows + 1)
+
+    return [
+        Component(first_label + i, int(size), int(x), int(y), int(x2 - x), int(y2 - y))
+        for i, (size, x, y, x2, y2) in enumerate(zip(sizes, left, top, right, bottom))
+    ]
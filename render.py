@@ -0,0 +1,25 @@
+"""
+Turns label grids into RGBA pixels, one pixel per tile, with no dependency on the UI toolkit
+"""
+import numpy
+
+from dungeon import LABELS
+
+# RGBA bytes of every label code, TileType values are the colours used by the viewer
+PALETTE = numpy.array([numpy.round(numpy.array(label(), dtype=float) * 255) for label in LABELS], dtype=numpy.uint8)
+
+
+def rgba_buffer(label_grid: numpy.ndarray, out: numpy.ndarray = None) -> numpy.ndarray:
+    """
+    Looks up the colour of every tile in one pass, rows are flipped since textures start at the bottom left
+    :param label_grid: uint8 array of label codes, indexed [y, x]
+    :type label_grid: numpy.ndarray
+    :param out: (height, width, 4) uint8 array to write into, reused between frames to avoid an allocation
+    :type out: numpy.ndarray
+    :return: (height, width, 4) uint8 array, row 0 is the bottom row of the map
+    :rtype: numpy.ndarray
+    """
+    if out is None:
+        out = numpy.empty(label_grid.shape + (4,), dtype=numpy.uint8)
+    numpy.take(PALETTE, label_grid[::-1], axis=0, out=out)
+    return out
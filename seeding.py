@@ -0,0 +1,36 @@
+"""
+Per generator random number streams
+
+Every generator draws from its own random.Random and numpy Generator, both derived from one numpy SeedSequence,
+so a level is reproduced from its seed alone and generators in different threads or processes never share state.
+Independent child streams for parallel work come from SeedSequence.spawn().
+"""
+import random
+
+import numpy
+
+from typing import Tuple, Union
+
+Seed = Union[None, int, numpy.random.SeedSequence]
+
+
+def seed_sequence(seed: Seed = None) -> numpy.random.SeedSequence:
+    """
+    :param seed: an int, a SeedSequence which is used as is, or None for fresh entropy from the OS
+    :type seed: Seed
+    :rtype: numpy.random.SeedSequence
+    """
+    if isinstance(seed, numpy.random.SeedSequence):
+        return seed
+    return numpy.random.SeedSequence(seed)
+
+
+def make_random(sequence: numpy.random.SeedSequence) -> Tuple[random.Random, numpy.random.Generator]:
+    """
+    Builds the python and numpy streams of a generator from one SeedSequence
+    The python stream is seeded with the first draw of the numpy stream so both follow from the same seed
+    :rtype: Tuple[random.Random, numpy.random.Generator]
+    """
+    np_random = numpy.random.default_rng(sequence)
+    return random.Random(int(np_random.integers(2 ** 63))), np_random
+
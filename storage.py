@@ -0,0 +1,220 @@
+"""
+Binary dungeon files
+
+A file is a fixed size header followed by one contiguous little endian array per section, each section starting on
+a page boundary so it can be memory mapped on its own:
+
+    labels      uint8  (height, width)   label codes, indices into dungeon.LABELS
+    regions     int32  (height, width)   region numbers, -1 for no region
+    passable    bool   (height, width)
+    rooms       int32  (room_count, 5)   x, y, width, height, region
+    doors       int32  (door_count, 2)   x, y
+    corridors   int32  (corridor_count, 2)   x, y
+    label_names bytes  (label_bytes,)    TileType names of the label codes, in code order, separated by newlines
+
+Label codes are positions in dungeon.LABELS, which follows the declaration order of TileType, so the names are
+stored with the file and codes are remapped on load if TileType has been reordered since it was written.
+
+Files are written with a single write of one buffer and opened with numpy.memmap, so a large level opens instantly
+and only the pages that are read are loaded from disk.
+"""
+import numpy
+
+from typing import Iterable, NamedTuple
+
+from dungeon import Dungeon, LABEL_CODES, LABELS
+from enums import TileType
+
+MAGIC = b"DGEN"
+FORMAT_VERSION = 1
+PAGE_SIZE = 4096
+
+SECTIONS = ("labels", "regions", "passable", "rooms", "doors", "corridors", "label_names")
+SECTION_DTYPES = {
+    "labels": numpy.dtype("u1"),
+    "regions": numpy.dtype("<i4"),
+    "passable": numpy.dtype("?"),
+    "rooms": numpy.dtype("<i4"),
+    "doors": numpy.dtype("<i4"),
+    "corridors": numpy.dtype("<i4"),
+    "label_names": numpy.dtype("u1"),
+}
+HEADER = numpy.dtype([
+    ("magic", "S4"),
+    ("version", "<u2"),
+    ("header_size", "<u2"),
+    ("height", "<u4"),
+    ("width", "<u4"),
+    ("room_count", "<u4"),
+    ("door_count", "<u4"),
+    ("corridor_count", "<u4"),
+    ("label_bytes", "<u4"),
+    ("offsets", "<u8", (len(SECTIONS),)),
+])
+
+
+class DungeonFile(NamedTuple):
+    """
+    Everything read from a dungeon file, the arrays are memory maps over the file
+    """
+    dungeon: Dungeon
+    rooms: numpy.ndarray
+    doors: numpy.ndarray
+    corridors: numpy.ndarray
+
+
+def label_remap(names) -> numpy.ndarray:
+    """
+    :param names: TileType names in the code order of a file
+    :return: uint8 array turning the label codes of the file into codes of dungeon.LABELS
+    :rtype: numpy.ndarray
+    :raises ValueError: if a name is not a TileType
+    """
+    try:
+        return numpy.array([LABEL_CODES[TileType[name]] for name in names], dtype=numpy.uint8)
+    except KeyError as error:
+        raise ValueError(f"unknown tile type {error.args[0]} in the label table") from None
+
+
+def align(offset: int) -> int:
+    return -(-offset // PAGE_SIZE) * PAGE_SIZE
+
+
+def points_array(points) -> numpy.ndarray:
+    """
+    :param points: objects with x and y, or an array of (x, y) rows
+    :return: int32 array of (x, y) rows
+    :rtype: numpy.ndarray
+    """
+    if isinstance(points, numpy.ndarray):
+        return points.astype("<i4", copy=False).reshape(-1, 2)
+    return numpy.array([(point.x, point.y) for point in points], dtype="<i4").reshape(-1, 2)
+
+
+def rooms_array(rooms) -> numpy.ndarray:
+    """
+    :param rooms: objects with x, y, width, height and region, such as generator.Room, or an array of rows
+    :return: int32 array of (x, y, width, height, region) rows, region is -1 for rooms without one
+    :rtype: numpy.ndarray
+    """
+    if isinstance(rooms, numpy.ndarray):
+        return rooms.astype("<i4", copy=False).reshape(-1, 5)
+    return numpy.array(
+        [(room.x, room.y, room.width, room.height, -1 if room.region is None else room.region) for room in rooms],
+        dtype="<i4",
+    ).reshape(-1, 5)
+
+
+def save_dungeon(path: str, dungeon: Dungeon, rooms: Iterable = (), doors: Iterable = None, corridors: Iterable = ()):
+    """
+    Writes a dungeon file, every section is copied into one buffer which is written in a single call
+    :param path: file to write
+    :type path: str
+    :param dungeon: dungeon to save
+    :type dungeon: Dungeon
+    :param rooms: rooms of the dungeon, see rooms_array()
+    :param doors: door positions, see points_array(), every door tile of the label grid if None
+    :param corridors: corridor positions, see points_array()
+    """
+    if doors is None:
+        ys, xs = numpy.nonzero(dungeon.label_grid == LABEL_CODES[TileType.DOOR])
+        doors = numpy.stack([xs, ys], axis=1)
+    arrays = {
+        "labels": dungeon.label_grid,
+        "regions": dungeon.region_grid,
+        "passable": dungeon.passable_grid,
+        "rooms": rooms_array(rooms),
+        "doors": points_array(doors),
+        "corridors": points_array(corridors),
+        "label_names": numpy.frombuffer("\n".join(label.name for label in LABELS).encode("ascii"), dtype=numpy.uint8),
+    }
+
+    header = numpy.zeros(1, dtype=HEADER)
+    header["magic"] = MAGIC
+    header["version"] = FORMAT_VERSION
+    header["header_size"] = HEADER.itemsize
+    header["height"] = dungeon.height
+    header["width"] = dungeon.width
+    header["room_count"] = len(arrays["rooms"])
+    header["door_count"] = len(arrays["doors"])
+    header["corridor_count"] = len(arrays["corridors"])
+    header["label_bytes"] = len(arrays["label_names"])
+
+    offset = HEADER.itemsize
+    for i, name in enumerate(SECTIONS):
+        offset = align(offset)
+        header["offsets"][0, i] = offset
+        offset += arrays[name].size * SECTION_DTYPES[name].itemsize
+
+    buffer = numpy.zeros(offset, dtype=numpy.uint8)
+    buffer[:HEADER.itemsize] = header.view(numpy.uint8)
+    for i, name in enumerate(SECTIONS):
+        start = int(header["offsets"][0, i])
+        data = numpy.ascontiguousarray(arrays[name], dtype=SECTION_DTYPES[name])
+        buffer[start:start + data.nbytes] = data.reshape(-1).view(numpy.uint8)
+    with open(path, "wb") as f:
+        f.write(buffer.data)
+
+
+def read_header(path: str) -> numpy.void:
+    """
+    :rtype: numpy.void
+    :raises ValueError: if the file is not a dungeon file or has another format version
+    """
+    header = numpy.fromfile(path, dtype=HEADER, count=1)
+    if len(header) != 1 or header["magic"][0] != MAGIC:
+        raise ValueError(f"{path} is not a dungeon file")
+    version = header["version"][0]
+    if version != FORMAT_VERSION:
+        raise ValueError(f"{path} has format version {version}, supported is {FORMAT_VERSION}")
+    return header[0]
+
+
+def read_label_names(path: str, header: numpy.void) -> tuple:
+    """
+    :return: TileType names of the label codes of the file, in code order
+    :rtype: tuple
+    """
+    offset = int(header["offsets"][SECTIONS.index("label_names")])
+    names = numpy.fromfile(path, dtype=numpy.uint8, count=int(header["label_bytes"]), offset=offset)
+    return tuple(names.tobytes().decode("ascii").split("\n"))
+
+
+def load_dungeon(path: str, mode: str = "r") -> DungeonFile:
+    """
+    Opens a dungeon file as memory maps, nothing but the header is read until the arrays are used
+    If the file's label table differs from dungeon.LABELS the label grid is remapped into memory instead
+    :param path: file to open
+    :type path: str
+    :param mode: numpy.memmap mode, "r" read only, "c" changes stay in memory, "r+" changes are written to the file
+    :type mode: str
+    :rtype: DungeonFile
+    :raises ValueError: for a remapped file opened with mode "r+", since changes could not be written back
+    """
+    header = read_header(path)
+    height, width = int(header["height"]), int(header["width"])
+    shapes = {
+        "labels": (height, width),
+        "regions": (height, width),
+        "passable": (height, width),
+        "rooms": (int(header["room_count"]), 5),
+        "doors": (int(header["door_count"]), 2),
+        "corridors": (int(header["corridor_count"]), 2),
+    }
+    remap = label_remap(read_label_names(path, header))
+    remapped = not numpy.array_equal(remap, numpy.arange(len(remap)))
+    if remapped and mode == "r+":
+        raise ValueError(f"{path} was written with other label codes, open it with mode 'r' or 'c'")
+
+    arrays = {}
+    for name, shape in shapes.items():
+        offset = header["offsets"][SECTIONS.index(name)]
+        if 0 in shape:
+            arrays[name] = numpy.zeros(shape, dtype=SECTION_DTYPES[name])
+            continue
+        arrays[name] = numpy.memmap(path, dtype=SECTION_DTYPES[name], mode=mode, offset=int(offset), shape=shape)
+    if remapped:
+        arrays["labels"] = remap[arrays["labels"]]
+
+    dungeon = Dungeon.from_arrays(arrays["labels"], arrays["regions"], arrays["passable"])
+    return DungeonFile(dungeon, arrays["rooms"], arrays["doors"], arrays["corridors"])
@@ -0,0 +1,19 @@
+import pytest
+
+from chunked import ChunkedDungeon
+from point import Point
+
+
+@pytest.mark.parametrize("point", [Point(-1, 0), Point(0, -1), Point(64, 0), Point(0, 48)])
+def test_points_outside_the_world_create_no_chunks(point):
+    world = ChunkedDungeon(48, 64, chunk_size=32, seed=1)
+    with pytest.raises(IndexError):
+        world.label(point)
+    with pytest.raises(IndexError):
+        world.set_tile(point, world.label(Point(0, 0)))
+    assert set(world.chunks) == {(0, 0)}
+
+
+def test_coordinates_must_be_integers():
+    with pytest.raises(TypeError):
+        ChunkedDungeon(48, 64, chunk_size=32, seed=1).label(Point(1.5, 2))
@@ -0,0 +1,143 @@
+import random
+
+import numpy
+import pytest
+
+from dungeon import LABEL_CODES
+from enums import TileType
+from generator import DungeonGenerator, lattice_mask
+from growingtree import CellList, parse_strategy
+from regions import label_components
+
+STRATEGIES = ["newest", "random", "oldest", "middle", "l", "r", "f", "m", {"newest": 3, "random": 1},
+              {"oldest": 1, "middle": 1, "random": 1}]
+
+
+def test_parse_strategy():
+    assert parse_strategy("f") == (("oldest",), (1.0,))
+    assert parse_strategy({"newest": 1, "r": 3}) == (("newest", "random"), (0.25, 1.0))
+    with pytest.raises(ValueError):
+        parse_strategy("zigzag")
+    with pytest.raises(ValueError):
+        parse_strategy({"newest": 0})
+
+
+@pytest.mark.parametrize("strategy", STRATEGIES)
+def test_cell_list_returns_every_cell_once(strategy):
+    cells = CellList(strategy, random.Random(3).random)
+    for cell in range(500):
+        cells.push(cell)
+    taken = []
+    while len(cells):
+        index = cells.select()
+        taken.append(cells[index])
+        cells.remove(index)
+    assert sorted(taken) == list(range(500))
+
+
+def test_newest_and_oldest_order():
+    for strategy, expected in (("newest", [4, 3, 2, 1, 0]), ("oldest", [0, 1, 2, 3, 4])):
+        cells = CellList(strategy)
+        for cell in range(5):
+            cells.push(cell)
+        taken = []
+        while len(cells):
+            index = cells.select()
+            taken.append(cells[index])
+            cells.remove(index)
+        assert taken == expected
+
+
+def test_middle_order():
+    cells = CellList("middle")
+    for cell in range(7):
+        cells.push(cell)
+    taken = []
+    while len(cells):
+        index = cells.select()
+        taken.append(cells[index])
+        cells.remove(index)
+    # the middle of the cells left each time, as list.pop(len(cells) // 2) would take them
+    assert taken == [3, 4, 2, 5, 1, 6, 0]
+
+
+@pytest.mark.parametrize("strategy", STRATEGIES)
+def test_cell_list_keeps_age_order(strategy):
+    rnd = random.Random(7)
+    cells = CellList(strategy, rnd.random)
+    # random alone never reads the order, only which cells are open
+    ordered = cells.ordered
+    expected = []
+    for cell in range(2000):
+        if expected and rnd.random() < 0.45:
+            index = cells.select()
+            if ordered:
+                assert cells[index] == expected.pop(index)
+            else:
+                expected.remove(cells[index])
+            cells.remove(index)
+        else:
+            cells.push(cell)
+            expected.append(cell)
+        opened = [cells[index] for index in range(len(cells))]
+        assert opened == expected if ordered else sorted(opened) == sorted(expected)
+
+
+@pytest.mark.parametrize("strategy", STRATEGIES)
+@pytest.mark.parametrize("winding_percent", [0, 20, 100])
+def test_carve_maze_fills_the_lattice_with_one_tree(strategy, winding_percent):
+    generator = DungeonGenerator({"map_height": 41, "map_width": 61, "seed": 5})
+    generator.initialize_map()
+    free = int(lattice_mask(generator.dungeon.label_grid).sum())
+    carved = generator.carve_maze(strategy=strategy, winding_percent=winding_percent)
+
+    corridor = generator.dungeon.walkable_mask()
+    # a spanning tree over the free lattice cells, one passage per cell but the first
+    assert carved == int(corridor.sum()) == free * 2 - 1
+    assert len(generator.corridors) == carved
+    assert len(label_components(corridor)) == 1
+    assert not lattice_mask(generator.dungeon.label_grid).any()
+    assert numpy.all(generator.dungeon.region_grid[corridor] == 0)
+
+
+@pytest.mark.parametrize("budget", [2, 17, 64])
+def test_iter_build_corridors_steps_stay_within_budget(budget):
+    settings = {"map_height": 61, "map_width": 81, "min_room_size": 5, "max_room_size": 11, "room_margin": 1,
+                "num_rooms": 8, "seed": 9}
+    generator = DungeonGenerator(settings)
+    generator.initialize_map()
+    generator.place_random_rooms(5, 11, attempts=100)
+    steps = generator.iter_build_corridors(budget=budget)
+    labels = generator.dungeon.label_grid.copy()
+    carved = 0
+    while True:
+        try:
+            next(steps)
+        except StopIteration as stop:
+            assert stop.value == carved
+            break
+        changed = int((generator.dungeon.label_grid != labels).sum())
+        assert changed <= budget
+        carved += changed
+        labels = generator.dungeon.label_grid.copy()
+
+    whole = DungeonGenerator(settings)
+    whole.initialize_map()
+    whole.place_random_rooms(5, 11, attempts=100)
+    whole.build_corridors()
+    assert numpy.array_equal(whole.dungeon.label_grid, generator.dungeon.label_grid)
+
+
+def test_carve_counters():
+    generator = DungeonGenerator({"map_height": 41, "map_width": 61, "seed": 5, "instrument": True})
+    generator.initialize_map()
+    generator.build_corridors()
+    report = generator.metrics.report()
+    free = int((generator.dungeon.label_grid != LABEL_CODES[TileType.WALL]).sum())
+    counters = report["counters"]
+    assert counters["carve_calls"] == free
+    # every lattice cell is visited once for each cell carved from it and once more when it is dropped
+    cells = (free + 1) // 2
+    assert counters["cells_visited"] == cells * 2 - 1
+    assert counters["can_carve_rejections"] > 0
+    assert "build_corridors" in report["stages"] and "carve_maze" not in report["stages"]
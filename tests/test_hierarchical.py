@@ -0,0 +1,93 @@
+import numpy
+import pytest
+
+from dungeon import Dungeon, LABEL_CODES
+from enums import TileType
+from generator import DungeonGenerator
+from pathfinding import HierarchicalPlanner, PathFinder
+from point import Point
+
+
+def generated(seed: int) -> Dungeon:
+    generator = DungeonGenerator({
+        "map_height": 81, "map_width": 121, "min_room_size": 5, "max_room_size": 11, "room_margin": 1,
+        "num_rooms": 25, "seed": seed,
+    })
+    generator.initialize_map()
+    generator.place_random_rooms(5, 11, attempts=250)
+    generator.build_corridors()
+    generator.generate_caves()
+    generator.prune_dead_ends(amount=5)
+    return generator.dungeon
+
+
+def caves(seed: int) -> Dungeon:
+    rng = numpy.random.default_rng(seed)
+    labels = numpy.where(
+        rng.random((70, 90)) < 0.62, LABEL_CODES[TileType.CAVE], LABEL_CODES[TileType.WALL]
+    ).astype(numpy.uint8)
+    return Dungeon.from_arrays(labels)
+
+
+def endpoints(dungeon: Dungeon, rng: numpy.random.Generator, count: int):
+    ys, xs = numpy.nonzero(dungeon.walkable_mask())
+    for start, goal in rng.integers(len(xs), size=(count, 2)):
+        yield Point(int(xs[start]), int(ys[start])), Point(int(xs[goal]), int(ys[goal]))
+
+
+def check_path(dungeon: Dungeon, path, start: Point, goal: Point):
+    walkable = dungeon.walkable_mask()
+    assert path[0] == goal
+    assert path[-1] == start
+    for step, previous in zip(path, path[1:]):
+        assert abs(step.x - previous.x) + abs(step.y - previous.y) == 1
+        assert walkable[step.y, step.x]
+
+
+@pytest.mark.parametrize("dungeon", [generated(1), generated(2), caves(3), caves(4)])
+@pytest.mark.parametrize("cluster_size", [8, 16, 32])
+def test_paths_match_the_tile_search(dungeon, cluster_size):
+    planner = HierarchicalPlanner(dungeon, cluster_size)
+    finder = PathFinder(dungeon)
+    for start, goal in endpoints(dungeon, numpy.random.default_rng(cluster_size), 40):
+        path = planner.find_path(start, goal)
+        shortest = finder.find_path(start, goal)
+        if shortest is None:
+            assert path is None
+            continue
+        assert path is not None
+        check_path(dungeon, path, start, goal)
+        assert len(path) >= len(shortest)
+
+
+def test_start_is_goal():
+    dungeon = generated(5)
+    start = next(endpoints(dungeon, numpy.random.default_rng(0), 1))[0]
+    assert HierarchicalPlanner(dungeon, 16).find_path(start, start) == [start]
+
+
+def test_endpoints_off_the_map_or_not_walkable():
+    dungeon = generated(6)
+    planner = HierarchicalPlanner(dungeon, 16)
+    start = next(endpoints(dungeon, numpy.random.default_rng(0), 1))[0]
+    ys, xs = numpy.nonzero(~dungeon.walkable_mask())
+    wall = Point(int(xs[0]), int(ys[0]))
+    for goal in (Point(-1, 0), Point(dungeon.width, 0), Point(0, dungeon.height), wall):
+        assert planner.find_path(start, goal) is None
+        assert planner.find_path(goal, start) is None
+
+
+def test_follows_changes_to_the_dungeon():
+    dungeon = Dungeon(20, 40)
+    dungeon.fill_rect(0, 10, 40, 1, TileType.CORRIDOR)
+    planner = HierarchicalPlanner(dungeon, 8)
+    start, goal = Point(0, 10), Point(39, 10)
+    assert len(planner.find_path(start, goal)) == 40
+
+    dungeon.set_tile(Point(20, 10), TileType.WALL)
+    assert planner.find_path(start, goal) is None
+
+    dungeon.fill_rect(19, 9, 3, 1, TileType.CORRIDOR)
+    path = planner.find_path(start, goal)
+    check_path(dungeon, path, start, goal)
+    assert len(path) == 42
@@ -0,0 +1,30 @@
+import numpy
+
+from dungeon import Dungeon
+from enums import TileType
+from navgraph import NavGraph
+from point import Point
+
+LABELS = (TileType.FLOOR, TileType.WALL, TileType.CORRIDOR, TileType.EMPTY)
+
+
+def test_updates_match_a_full_build():
+    rng = numpy.random.default_rng(0)
+    dungeon = Dungeon(40, 50)
+    graph = dungeon.nav_graph
+    for step in range(300):
+        label = LABELS[rng.integers(len(LABELS))]
+        kind = step % 3
+        if kind == 0:
+            dungeon.set_tile(Point(int(rng.integers(50)), int(rng.integers(40))), label)
+        elif kind == 1:
+            # rectangles may hang off any side of the map
+            x, y = rng.integers(-10, 50), rng.integers(-10, 40)
+            dungeon.fill_rect(int(x), int(y), int(rng.integers(1, 20)), int(rng.integers(1, 20)), label, 3)
+        else:
+            dungeon.set_tiles(rng.random((40, 50)) < 0.05, label)
+
+        built = NavGraph.from_dungeon(dungeon)
+        numpy.testing.assert_array_equal(graph.links, built.links)
+        numpy.testing.assert_array_equal(graph.indptr, built.indptr)
+        numpy.testing.assert_array_equal(graph.indices, built.indices)
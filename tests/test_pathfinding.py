@@ -0,0 +1,76 @@
+import numpy
+import pytest
+
+from dungeon import Dungeon, LABEL_CODES
+from enums import TileType
+from pathfinding import bfs_distances, DistanceField
+from point import Point
+
+
+def corridor() -> Dungeon:
+    dungeon = Dungeon(3, 5)
+    dungeon.fill_rect(0, 1, 5, 1, TileType.FLOOR)
+    return dungeon
+
+
+@pytest.mark.parametrize("target", [Point(-1, 1), Point(5, 1), Point(2, 3), Point(2, 0)])
+def test_distance_field_rejects_targets_off_the_map_or_not_walkable(target):
+    dungeon = corridor()
+    assert dungeon.distance_field(target) is None
+    assert not dungeon._flow_fields.fields
+    with pytest.raises(ValueError):
+        DistanceField(dungeon.path_finder, target)
+
+
+def test_distance_field_walkable_target():
+    field = corridor().distance_field(Point(4, 1))
+    assert field.distance(Point(0, 1)) == 4
+    assert field.next_step(Point(0, 1)) == Point(1, 1)
+
+
+def random_dungeon(rng: numpy.random.Generator, height: int, width: int, density: float) -> Dungeon:
+    labels = numpy.where(
+        rng.random((height, width)) < density, LABEL_CODES[TileType.FLOOR], LABEL_CODES[TileType.WALL]
+    ).astype(numpy.uint8)
+    return Dungeon.from_arrays(labels)
+
+
+def test_find_path_is_as_short_as_breadth_first_search():
+    rng = numpy.random.default_rng(11)
+    for _ in range(150):
+        height, width = (int(size) for size in rng.integers(1, 30, size=2))
+        dungeon = random_dungeon(rng, height, width, rng.uniform(0.4, 0.9))
+        graph = dungeon.nav_graph
+        ys, xs = numpy.nonzero(dungeon.walkable_mask())
+        if not len(xs):
+            continue
+        for _ in range(5):
+            start_index, goal_index = rng.integers(len(xs), size=2)
+            start = Point(int(xs[start_index]), int(ys[start_index]))
+            goal = Point(int(xs[goal_index]), int(ys[goal_index]))
+            distances = bfs_distances(graph.indptr, graph.indices, graph.cell(start.x, start.y))
+            distance = int(distances[graph.cell(goal.x, goal.y)])
+            path = dungeon.find_path(start, goal)
+            if distance < 0:
+                assert path is None
+                continue
+            assert len(path) - 1 == distance
+            assert path[0] == goal and path[-1] == start
+            for step, previous in zip(path, path[1:]):
+                assert abs(step.x - previous.x) + abs(step.y - previous.y) == 1
+                assert dungeon.walkable_mask()[step.y, step.x]
+
+
+@pytest.mark.parametrize("start, goal", [
+    (Point(-1, 1), Point(4, 1)),
+    (Point(0, 1), Point(5, 1)),
+    (Point(0, 1), Point(2, -1)),
+    (Point(2, 0), Point(4, 1)),
+    (Point(0, 1), Point(2, 2)),
+])
+def test_find_path_rejects_endpoints_off_the_map_or_not_walkable(start, goal):
+    assert corridor().find_path(start, goal) is None
+
+
+def test_find_path_same_start_and_goal():
+    assert corridor().find_path(Point(2, 1), Point(2, 1)) == [Point(2, 1)]
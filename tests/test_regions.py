@@ -0,0 +1,66 @@
+from collections import deque
+
+import numpy
+import pytest
+
+from regions import label_components
+
+OFFSETS = ((0, 1), (0, -1), (1, 0), (-1, 0))
+DIAGONAL_OFFSETS = OFFSETS + ((1, 1), (1, -1), (-1, 1), (-1, -1))
+
+
+def flood_fill(mask: numpy.ndarray, diagonal: bool = False) -> numpy.ndarray:
+    """
+    labels connected groups of set cells one cell at a time, numbered in scan order like label_components()
+    """
+    labels = numpy.full(mask.shape, -1, dtype=numpy.int32)
+    height, width = mask.shape
+    offsets = DIAGONAL_OFFSETS if diagonal else OFFSETS
+    count = 0
+    for y in range(height):
+        for x in range(width):
+            if not mask[y, x] or labels[y, x] != -1:
+                continue
+            labels[y, x] = count
+            queue = deque([(y, x)])
+            while queue:
+                cy, cx = queue.popleft()
+                for dy, dx in offsets:
+                    ny, nx = cy + dy, cx + dx
+                    if 0 <= ny < height and 0 <= nx < width and mask[ny, nx] and labels[ny, nx] == -1:
+                        labels[ny, nx] = count
+                        queue.append((ny, nx))
+            count += 1
+    return labels
+
+
+@pytest.mark.parametrize("diagonal", [False, True])
+def test_label_components_matches_flood_fill(diagonal):
+    rng = numpy.random.default_rng(7)
+    for _ in range(200):
+        height, width = rng.integers(1, 24, size=2)
+        mask = rng.random((height, width)) < rng.uniform(0.2, 0.8)
+        labels = numpy.full(mask.shape, -1, dtype=numpy.int32)
+        components = label_components(mask, labels, diagonal=diagonal)
+        expected = flood_fill(mask, diagonal)
+
+        numpy.testing.assert_array_equal(labels, expected)
+        assert [component.region for component in components] == list(range(len(components)))
+        for component in components:
+            ys, xs = numpy.nonzero(expected == component.region)
+            assert component.size == len(ys)
+            assert (component.x, component.y) == (xs.min(), ys.min())
+            assert (component.width, component.height) == (xs.max() - xs.min() + 1, ys.max() - ys.min() + 1)
+
+
+def test_label_components_first_label_and_untouched_cells():
+    mask = numpy.array([[1, 0, 1], [0, 0, 1]], dtype=bool)
+    labels = numpy.full(mask.shape, 9, dtype=numpy.int32)
+    components = label_components(mask, labels, first_label=4)
+
+    assert [component.region for component in components] == [4, 5]
+    numpy.testing.assert_array_equal(labels, [[4, 9, 5], [9, 9, 5]])
+
+
+def test_label_components_empty_mask():
+    assert label_components(numpy.zeros((3, 4), dtype=bool)) == []
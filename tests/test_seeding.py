@@ -0,0 +1,41 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy
+
+from generator import DungeonGenerator
+
+SETTINGS = {"map_height": 41, "map_width": 61, "min_room_size": 5, "max_room_size": 11, "room_margin": 1,
+            "num_rooms": 12}
+
+
+def build(generator: DungeonGenerator) -> numpy.ndarray:
+    generator.initialize_map()
+    generator.place_random_rooms(5, 11, attempts=100)
+    generator.build_corridors()
+    generator.generate_caves()
+    generator.prune_dead_ends(amount=5)
+    return generator.dungeon.label_grid.copy()
+
+
+def test_same_seed_rebuilds_the_same_level():
+    first = build(DungeonGenerator(dict(SETTINGS, seed=11)))
+    assert numpy.array_equal(first, build(DungeonGenerator(dict(SETTINGS, seed=11))))
+    assert not numpy.array_equal(first, build(DungeonGenerator(dict(SETTINGS, seed=12))))
+
+
+def test_spawned_children_are_reproducible_and_independent():
+    children = [build(child) for child in DungeonGenerator(dict(SETTINGS, seed=3)).spawn(4)]
+    again = [build(child) for child in DungeonGenerator(dict(SETTINGS, seed=3)).spawn(4)]
+    for child, repeat in zip(children, again):
+        assert numpy.array_equal(child, repeat)
+    for index, child in enumerate(children):
+        for other in children[index + 1:]:
+            assert not numpy.array_equal(child, other)
+
+
+def test_spawned_children_build_the_same_levels_in_a_thread_pool():
+    sequential = [build(child) for child in DungeonGenerator(dict(SETTINGS, seed=3)).spawn(8)]
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        threaded = list(executor.map(build, DungeonGenerator(dict(SETTINGS, seed=3)).spawn(8)))
+    for level, other in zip(sequential, threaded):
+        assert numpy.array_equal(level, other)
@@ -0,0 +1,63 @@
+import numpy
+import pytest
+
+import storage
+
+from dungeon import Dungeon, LABEL_CODES, LABELS
+from enums import TileType
+from storage import load_dungeon, save_dungeon
+
+
+def sample() -> Dungeon:
+    dungeon = Dungeon(6, 7)
+    dungeon.fill_rect(1, 1, 3, 2, TileType.FLOOR, 0)
+    dungeon.fill_rect(4, 3, 2, 2, TileType.CAVE, 1)
+    return dungeon
+
+
+def test_round_trip(tmp_path):
+    path = str(tmp_path / "level.dgn")
+    dungeon = sample()
+    save_dungeon(path, dungeon, corridors=numpy.array([[2, 3]]))
+    loaded = load_dungeon(path)
+
+    assert isinstance(loaded.dungeon.label_grid, numpy.memmap)
+    numpy.testing.assert_array_equal(loaded.dungeon.label_grid, dungeon.label_grid)
+    numpy.testing.assert_array_equal(loaded.dungeon.region_grid, dungeon.region_grid)
+    numpy.testing.assert_array_equal(loaded.corridors, [[2, 3]])
+
+
+def test_labels_are_remapped_after_a_reorder(tmp_path, monkeypatch):
+    path = str(tmp_path / "level.dgn")
+    dungeon = sample()
+    # write the file as if CAVE and FLOOR had swapped places in TileType
+    swapped = list(LABELS)
+    floor, cave = LABEL_CODES[TileType.FLOOR], LABEL_CODES[TileType.CAVE]
+    swapped[floor], swapped[cave] = swapped[cave], swapped[floor]
+    written = dungeon.label_grid.copy()
+    written[dungeon.label_grid == floor] = cave
+    written[dungeon.label_grid == cave] = floor
+    monkeypatch.setattr(storage, "LABELS", tuple(swapped))
+    save_dungeon(path, Dungeon.from_arrays(written, dungeon.region_grid, dungeon.passable_grid))
+    monkeypatch.setattr(storage, "LABELS", LABELS)
+
+    numpy.testing.assert_array_equal(load_dungeon(path).dungeon.label_grid, dungeon.label_grid)
+    with pytest.raises(ValueError):
+        load_dungeon(path, mode="r+")
+
+
+def test_not_a_dungeon_file(tmp_path):
+    path = tmp_path / "level.dgn"
+    path.write_bytes(b"nope" * 16)
+    with pytest.raises(ValueError):
+        load_dungeon(str(path))
+
+
+def test_other_format_version(tmp_path):
+    path = str(tmp_path / "level.dgn")
+    save_dungeon(path, sample())
+    with open(path, "r+b") as f:
+        f.seek(len(storage.MAGIC))
+        f.write(numpy.array([storage.FORMAT_VERSION + 1], dtype="<u2").tobytes())
+    with pytest.raises(ValueError):
+        load_dungeon(path)
@@ -17,6 +17,8 @@ class Tile:
         passable: if the tile is passable
     """
 
+    __slots__ = ("position", "label", "passable")
+
     def __init__(self, x: int, y: int, *, label: TileType = TileType.EMPTY, passable: bool = False):
         self.position = Point(x, y)
         self.label = label
@@ -36,6 +38,18 @@ class Tile:
     def y(self) -> int:
         return self.position.y
 
+    @staticmethod
+    def shared(label: TileType) -> "Tile":
+        """
+        returns the single immutable Tile shared by every tile with the label provided
+        shared tiles have no position, it is up to the caller to keep track of where the tile is
+        :param label: label of the tile
+        :type label: TileType
+        :return: the shared tile for label
+        :rtype: SharedTile
+        """
+        return SHARED_TILES[label]
+
     @staticmethod
     def from_label(point: Point, label: TileType):
         """
@@ -57,6 +71,8 @@ class Tile:
             return Tile.door(point)
         elif label is TileType.CORRIDOR:
             return Tile.corridor(point)
+        elif label is TileType.CAVE:
+            return Tile.cave(point)
 
         return Tile.error(point)
 
@@ -93,6 +109,17 @@ class Tile:
         """
         return Tile(point.x, point.y, label=TileType.CORRIDOR, passable=True)
 
+    @classmethod
+    def cave(cls, point):
+        """
+        creates a cave Tile that is passable
+        :param point: x- and y-coordinates for the tile
+        :type point: Point
+        :return: returns a tile at x and y of point with the label "CAVE" and passable
+        :rtype: Tile
+        """
+        return Tile(point.x, point.y, label=TileType.CAVE, passable=True)
+
     @classmethod
     def wall(cls, point):
         """
@@ -118,3 +145,43 @@ class Tile:
     @classmethod
     def error(cls, point):
         return Tile(point.x, point.y, label=TileType.RED)
+
+
+class SharedTile(Tile):
+    """
+    A flyweight Tile without a position, one instance exists per TileType, see Tile.shared()
+
+    Args:
+        label for the tile
+        passable or not
+    """
+
+    __slots__ = ()
+
+    def __init__(self, label: TileType, passable: bool):
+        object.__setattr__(self, "position", None)
+        object.__setattr__(self, "label", label)
+        object.__setattr__(self, "passable", passable)
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{self.__class__.__name__} is shared and cannot be changed")
+
+    @property
+    def x(self) -> int:
+        raise AttributeError("shared tiles have no coordinates, use Dungeon.tile() for a positioned Tile")
+
+    @property
+    def y(self) -> int:
+        raise AttributeError("shared tiles have no coordinates, use Dungeon.tile() for a positioned Tile")
+
+    def __str__(self):
+        return f"Tile = {self.label}, {self.passable}"
+
+    def __repr__(self):
+        return f"({self.__class__.__name__}) label={self.label}, passable={self.passable}"
+
+
+SHARED_TILES = {
+    label: SharedTile(label, Tile.from_label(Point(-1, -1), label).passable)
+    for label in TileType
+}